@@ -0,0 +1,291 @@
+'''
+See the README for more detail about the general project.
+
+This script contains an asyncio client that downloads weekly archive files of
+NEM data concurrently, for backfilling years of data for several regions from a
+server that mirrors the archive. The files have the same <region>_<yyyymmdd>.csv
+layout as data/power and are parsed into the same df_5 and df_30 DataFrames
+that web_api.load_data() returns. The client does not talk to the OpenNEM api
+itself, so a backfill from OpenNEM still uses web_api.
+
+The client uses one aiohttp connection pool, limits the number of requests in
+flight and the rate at which they are started, and retries failed requests with
+exponential backoff and random jitter. Each response is parsed as it streams in:
+the complete lines received so far are parsed in a worker thread every
+parse_size bytes, while the event loop keeps reading this and the other
+connections.
+
+It also contains MockArchiveServer, a local HTTP server that serves the files in
+data/power with an optional added latency, so the client can be tested and its
+throughput benchmarked offline.
+
+## Use Case:
+
+Import the classes from async_client.py:
+    from async_client import AsyncArchiveClient, MockArchiveServer
+
+Serve data/power locally:
+    server = MockArchiveServer(data_dir='data/power', latency=0.05)
+    server.start()
+
+Download a date range:
+    c = AsyncArchiveClient(base_url=server.url, concurrency=16, rate_limit=100)
+    df_5, df_30 = c.load_data(d1=datetime.datetime(2018,1,1),
+                              d2=datetime.datetime(2019,1,1), region='nsw1')
+
+Use the client as the download backend of a DataHandler, for a server of
+archive files:
+    h.loader = c
+    h.collect_data(d_start='2018-01-01', d_end='2019-01-01', region='nsw1')
+
+Benchmark the client against the mock server:
+    python async_client.py
+
+'''
+
+import asyncio
+import datetime
+import functools
+import http.server
+import io
+import os
+import random
+import threading
+import time
+
+import aiohttp
+import pandas as pd
+
+from data_handler import DataHandlerError, ARCHIVE_FILE_SPAN, split_resolutions
+
+
+class AsyncArchiveClient:
+    def __init__(self, base_url='http://127.0.0.1:8000', concurrency=8, rate_limit=None,
+                 retries=3, backoff=0.5, timeout=60, chunk_size=2**16, parse_size=2**20):
+        '''base_url is the url of the folder of archive files, concurrency is
+        the maximum number of requests in flight, rate_limit is the maximum
+        number of requests started per second (None for no limit), retries is
+        the number of times a failed request is retried and backoff is the base
+        delay in seconds between retries. Responses are read in chunks of
+        chunk_size bytes and parsed every parse_size bytes.'''
+
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = concurrency
+        self.rate_limit = rate_limit
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.parse_size = parse_size
+        self.missing = []
+
+    def load_data(self, d1, d2, region='sa1'):
+        '''Downloads the data of a region between the datetimes d1 and d2 and
+        returns it as a 5 minute and a 30 minute DataFrame, with the same
+        arguments and return values as web_api.load_data().'''
+
+        return asyncio.run(self.fetch_range(d1, d2, region))
+
+    async def fetch_range(self, d1, d2, region='sa1'):
+        '''Downloads every weekly file that overlaps d1 to d2 concurrently and
+        returns the 5 minute and 30 minute DataFrames trimmed to the range.'''
+
+        d1 = pd.Timestamp(d1)
+        d2 = pd.Timestamp(d2)
+        if d2 < d1:
+            raise DataHandlerError('d2 must not be before d1')
+
+        # Archive files start at midnight on Mondays
+        first = (d1 - pd.Timedelta(minutes=5)).normalize()
+        first = first - pd.Timedelta(days=first.weekday())
+        weeks = pd.date_range(first, d2, freq=pd.Timedelta(ARCHIVE_FILE_SPAN))
+
+        self.missing = []
+        self._next_start = 0.0
+        self._rate_lock = asyncio.Lock()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            frames = await asyncio.gather(*[self.fetch_week(session, semaphore, region, d)
+                                            for d in weeks])
+
+        frames = [f for f in frames if f is not None]
+        if not frames:
+            raise DataHandlerError('No data found for ' + region + ' between ' +
+                                   str(d1) + ' and ' + str(d2))
+
+        range_df = pd.concat(frames, sort=False)
+        i = range_df.index.searchsorted(d1, side='left')
+        j = range_df.index.searchsorted(d2, side='right')
+        return split_resolutions(range_df.iloc[i:j])
+
+    async def fetch_week(self, session, semaphore, region, d):
+        '''Downloads and parses the archive file of the week starting on d.
+        Returns None if the server does not have the file.'''
+
+        url = self.base_url + '/' + region + '_' + d.strftime('%Y%m%d') + '.csv'
+        loop = asyncio.get_running_loop()
+
+        for attempt in range(self.retries + 1):
+            async with semaphore:
+                await self.wait_for_rate_limit()
+                try:
+                    async with session.get(url) as resp:
+                        if resp.status == 404:
+                            self.missing.append(d)
+                            return None
+                        if resp.status == 429 or resp.status >= 500:
+                            raise aiohttp.ClientResponseError(resp.request_info, resp.history,
+                                                              status=resp.status)
+                        resp.raise_for_status()
+
+                        parts = await self.read_csv_stream(resp, loop)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if attempt == self.retries:
+                        raise DataHandlerError('Issue occurred during download of ' +
+                                               url + ': ' + str(e))
+                else:
+                    week_df = pd.concat(await asyncio.gather(*parts), sort=False)
+                    week_df.index.name = None
+                    return week_df
+
+            # Exponential backoff with jitter, outside of the semaphore so the
+            # other requests can use the connection
+            await asyncio.sleep(self.backoff * 2**attempt * random.uniform(0.5, 1.5))
+
+    async def read_csv_stream(self, resp, loop):
+        '''Reads a CSV response in chunks and starts parsing the complete lines
+        in a worker thread every parse_size bytes, with the header line added
+        to each part. Returns the futures of the parsed parts in order.'''
+
+        header = None
+        pending = b''
+        batch = []
+        batch_size = 0
+        parts = []
+
+        async for chunk in resp.content.iter_chunked(self.chunk_size):
+            pending += chunk
+            cut = pending.rfind(b'\n')
+            if cut == -1:
+                continue
+            lines, pending = pending[:cut + 1], pending[cut + 1:]
+            if header is None:
+                end = lines.find(b'\n') + 1
+                header, lines = lines[:end], lines[end:]
+            batch.append(lines)
+            batch_size += len(lines)
+            if batch_size >= self.parse_size:
+                parts.append(loop.run_in_executor(None, parse_csv_part, header, b''.join(batch)))
+                batch = []
+                batch_size = 0
+
+        # The last line may not end with a newline
+        if header is None:
+            header, pending = pending, b''
+        batch.append(pending)
+        parts.append(loop.run_in_executor(None, parse_csv_part, header, b''.join(batch)))
+        return parts
+
+    async def wait_for_rate_limit(self):
+        '''Sleeps until the next request can be started without going over
+        rate_limit requests per second.'''
+
+        if not self.rate_limit:
+            return
+        async with self._rate_lock:
+            now = time.monotonic()
+            wait = self._next_start - now
+            self._next_start = max(now, self._next_start) + 1.0 / self.rate_limit
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class MockArchiveServer:
+    def __init__(self, data_dir='data/power', host='127.0.0.1', port=0, latency=0.0):
+        '''data_dir is the folder of archive files to serve, port=0 picks a
+        free port and latency is the delay in seconds added to each request.'''
+
+        self.data_dir = data_dir
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self):
+        return 'http://' + self.host + ':' + str(self.port)
+
+    def start(self):
+        '''Starts the server in a background thread.'''
+
+        handler = functools.partial(MockArchiveHandler, directory=self.data_dir,
+                                    latency=self.latency)
+        self.server = http.server.ThreadingHTTPServer((self.host, self.port), handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        '''Stops the server.'''
+
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.thread.join()
+            self.server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+class MockArchiveHandler(http.server.SimpleHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def __init__(self, *args, latency=0.0, **kwargs):
+        self.latency = latency
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def parse_csv_part(header, body):
+    '''Parses the bytes of some complete lines of an archive file, with the
+    header line of the file, into a DataFrame.'''
+
+    return pd.read_csv(io.BytesIO(header + body), index_col=0, parse_dates=True)
+
+def main(data_dir='data/power', region='nsw1', latency=0.05):
+    '''Benchmarks downloading the archive of a region from the mock server
+    with a single connection and with several concurrent connections.'''
+
+    d1 = datetime.datetime(2018, 1, 1)
+    d2 = datetime.datetime(2019, 2, 10)
+    size = sum(os.path.getsize(os.path.join(data_dir, f)) for f in os.listdir(data_dir)
+               if f.startswith(region + '_'))
+
+    with MockArchiveServer(data_dir=data_dir, latency=latency) as server:
+        for concurrency in [1, 4, 16]:
+            c = AsyncArchiveClient(base_url=server.url, concurrency=concurrency)
+            start = time.time()
+            df_5, df_30 = c.load_data(d1=d1, d2=d2, region=region)
+            elapsed = time.time() - start
+            print('- concurrency ' + str(concurrency) + ': ' + str(len(df_5)) + ' rows in ' +
+                  '%.2f' % elapsed + 's, ' + '%.1f' % (size / elapsed / 1e6) + ' MB/s')
+
+if __name__ == "__main__":
+    main()
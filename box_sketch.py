@@ -0,0 +1,281 @@
+'''
+See the README for more detail about the general project.
+
+This script contains a class object that keeps a mergeable summary of each
+field for box plots. It is built in one pass over the data without sorting it:
+- a histogram of counts on fixed bin edges, like HistCube, that gives the
+  quartiles and whiskers by interpolating within a bin
+- the count, sum, min and max
+- the k smallest and k largest values, which give exact quantiles and whiskers
+  near the ends of the data and a capped sample of the outliers
+
+Summaries of different chunks of data can be merged, so the whole archive of a
+region can be summarised a few weeks at a time, and the stats are drawn with
+matplotlib's bxp instead of passing every value to a box plot.
+
+## Use Case:
+
+Import the class and functions from box_sketch.py:
+    from box_sketch import BoxSketch, summarise_archive, plot_box_stats
+
+Summarise the data of a DataHandler and get the box plot stats of a field:
+    s = BoxSketch(k=1000)
+    s.update(h.df_5)
+    s.update(h.df_30)
+    s.stats(field='PRICE', whis=1.5)
+    s.quantile(field='PRICE', q=99)
+
+Summarise the archive of a region in data/power, four weeks at a time:
+    s = summarise_archive(region='nsw1', data_dir='data/power', chunk_weeks=4)
+
+Draw box plots of the stats of several fields, saving them to a file:
+    plot_box_stats([s.stats(f) for f in s.fields()], fname='boxplots.png')
+
+'''
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+
+from data_handler import DataHandler, DataHandlerError, split_resolutions
+from hist_cube import bin_percentile, log_edges
+
+# The fixed inner bin edges of each field, values outside the edges are counted
+# in the first and last bins. Fields not listed use DEFAULT_BOX_EDGES.
+BOX_EDGES = {
+    'PRICE': log_edges(-1000, 15000, 1000),
+    'DEMAND': np.linspace(0, 15000, 3001),
+    'TEMPERATURE': np.linspace(-10, 50, 1201),
+}
+DEFAULT_BOX_EDGES = np.linspace(-5000, 15000, 4001)
+
+
+class BoxSketch:
+    def __init__(self, edges=None, k=1000, chunk_size=2**18):
+        '''edges is a dict of the inner bin edges of any fields that should not
+        use the default bins, k is the number of smallest and largest values
+        kept and chunk_size is the number of rows added at a time.'''
+
+        self.edges = dict(BOX_EDGES)
+        if edges is not None:
+            self.edges.update(edges)
+        self.k = k
+        self.chunk_size = chunk_size
+        self.counts = {}
+        self.n = {}
+        self.total = {}
+        self.low = {}
+        self.high = {}
+        self.full_edges = {}
+
+    def field_edges(self, field):
+        '''Returns the bin edges of a field, including the open ended bins.'''
+
+        if field not in self.full_edges:
+            inner = self.edges.get(field, DEFAULT_BOX_EDGES)
+            self.full_edges[field] = np.concatenate(([-np.inf], inner, [np.inf]))
+        return self.full_edges[field]
+
+    def fields(self):
+        '''Returns the fields that have values in the sketch.'''
+
+        return list(self.n)
+
+    def update(self, df):
+        '''Adds the values of every field of df to the sketch, chunk_size rows
+        at a time.'''
+
+        for i in range(0, len(df), self.chunk_size):
+            chunk_df = df.iloc[i:i+self.chunk_size]
+            for f in list(chunk_df):
+                values = chunk_df[f].to_numpy(dtype=np.float64)
+                values = values[~np.isnan(values)]
+                if len(values):
+                    self.add(f, values)
+
+    def add(self, field, values):
+        '''Adds a 1D array of values, without NaN values, to a field.'''
+
+        edges = self.field_edges(field)
+        bins = np.searchsorted(edges, values, side='right') - 1
+        counts = np.bincount(bins, minlength=len(edges) - 1)
+
+        if field not in self.n:
+            self.counts[field] = np.zeros(len(edges) - 1, dtype=np.int64)
+            self.n[field] = 0
+            self.total[field] = 0.0
+            self.low[field] = np.zeros(0)
+            self.high[field] = np.zeros(0)
+
+        self.counts[field] += counts
+        self.n[field] += len(values)
+        self.total[field] += values.sum()
+        self.low[field] = smallest(np.concatenate((self.low[field], values)), self.k)
+        self.high[field] = largest(np.concatenate((self.high[field], values)), self.k)
+
+    def merge(self, other):
+        '''Adds the summaries of another BoxSketch with the same bins to this
+        one. The number of smallest and largest values kept is that of this
+        sketch.'''
+
+        for f in other.fields():
+            if not np.array_equal(self.field_edges(f), other.field_edges(f)):
+                raise DataHandlerError('Sketches must have the same bins to be merged: ' + f)
+            if f not in self.n:
+                self.counts[f] = other.counts[f].copy()
+                self.n[f] = other.n[f]
+                self.total[f] = other.total[f]
+                self.low[f] = smallest(other.low[f], self.k)
+                self.high[f] = largest(other.high[f], self.k)
+                continue
+            self.counts[f] += other.counts[f]
+            self.n[f] += other.n[f]
+            self.total[f] += other.total[f]
+            self.low[f] = smallest(np.concatenate((self.low[f], other.low[f])), self.k)
+            self.high[f] = largest(np.concatenate((self.high[f], other.high[f])), self.k)
+        return self
+
+    def check_field(self, field):
+        if field not in self.n:
+            raise DataHandlerError(str(field) + ' is not in the sketch')
+
+    def quantile(self, field='PRICE', q=50):
+        '''Returns the q-th percentile (0 to 100) of a field, interpolated
+        linearly between values like numpy.percentile. It is exact if it falls
+        within the smallest or largest values kept, otherwise it is
+        interpolated within its bin of the histogram.'''
+
+        self.check_field(field)
+        n = self.n[field]
+        low, high = self.low[field], self.high[field]
+        rank = q / 100 * (n - 1)
+        i = int(np.floor(rank))
+        j = min(i + 1, n - 1)
+
+        # Both neighbours of the rank are among the smallest values
+        if j < len(low):
+            return low[i] + (rank - i) * (low[j] - low[i])
+        # Both neighbours of the rank are among the largest values
+        first_high = n - len(high)
+        if i >= first_high:
+            return high[i - first_high] + (rank - i) * (high[j - first_high] - high[i - first_high])
+
+        value = bin_percentile(self.counts[field], self.field_edges(field), q)
+        return float(np.clip(value, low[-1], high[0]))
+
+    def count_below(self, field, x):
+        '''Returns the number of values of a field below x, which is exact if
+        it is fewer than the smallest values kept.'''
+
+        low = self.low[field]
+        if len(low) == self.n[field] or low[-1] >= x:
+            return int((low < x).sum())
+        return int(round(bin_count_below(self.counts[field], self.field_edges(field), x)))
+
+    def count_above(self, field, x):
+        '''Returns the number of values of a field above x, which is exact if
+        it is fewer than the largest values kept.'''
+
+        high = self.high[field]
+        if len(high) == self.n[field] or high[0] <= x:
+            return int((high > x).sum())
+        below = bin_count_below(self.counts[field], self.field_edges(field), x)
+        return int(round(self.n[field] - below))
+
+    def stats(self, field='PRICE', whis=1.5, label=None):
+        '''Returns a dict of the box plot stats of a field in the format of
+        matplotlib.cbook.boxplot_stats, to be drawn with Axes.bxp. The
+        whiskers reach the furthest values within whis times the interquartile
+        range of the box. fliers holds the outliers among the smallest and
+        largest values kept, and n_low and n_high the number of outliers.'''
+
+        self.check_field(field)
+        low, high = self.low[field], self.high[field]
+        q1, med, q3 = [self.quantile(field, q) for q in [25, 50, 75]]
+        iqr = q3 - q1
+        lo_limit = q1 - whis * iqr
+        hi_limit = q3 + whis * iqr
+
+        # The whiskers are exact if they fall within the values kept, otherwise
+        # they are the edge of the first bin with values inside the limits
+        edges = self.field_edges(field)
+        counts = self.counts[field]
+        if low[-1] >= lo_limit:
+            whislo = low[low >= lo_limit][0]
+        else:
+            b = np.flatnonzero((counts > 0) & (edges[1:] > lo_limit))[0]
+            whislo = min(max(edges[b], lo_limit), q1)
+        if high[0] <= hi_limit:
+            whishi = high[high <= hi_limit][-1]
+        else:
+            b = np.flatnonzero((counts > 0) & (edges[:-1] < hi_limit))[-1]
+            whishi = max(min(edges[b + 1], hi_limit), q3)
+
+        fliers = np.concatenate((low[low < whislo], high[high > whishi]))
+        return {'label': field if label is None else label, 'mean': self.total[field] / self.n[field],
+                'med': med, 'q1': q1, 'q3': q3, 'iqr': iqr, 'whislo': whislo, 'whishi': whishi,
+                'fliers': np.unique(fliers), 'n': self.n[field],
+                'n_low': self.count_below(field, whislo), 'n_high': self.count_above(field, whishi)}
+
+
+def smallest(values, k):
+    '''Returns the k smallest values, sorted, without sorting all values.'''
+
+    if len(values) > k:
+        values = np.partition(values, k - 1)[:k]
+    return np.sort(values)
+
+def largest(values, k):
+    '''Returns the k largest values, sorted, without sorting all values.'''
+
+    if len(values) > k:
+        values = np.partition(values, len(values) - k)[-k:]
+    return np.sort(values)
+
+def bin_count_below(counts, edges, x):
+    '''Returns the number of values counted into the bins with the given edges
+    that are below x, assuming values are spread evenly within each bin.'''
+
+    b = np.searchsorted(edges, x, side='right') - 1
+    below = counts[:b].sum()
+    lo, hi = edges[b], edges[b + 1]
+    if np.isfinite(lo) and np.isfinite(hi):
+        below += counts[b] * (x - lo) / (hi - lo)
+    return below
+
+def summarise_archive(region='sa1', data_dir='data/power', chunk_weeks=4, edges=None, k=1000):
+    '''This function summarises the weekly CSV archive of a region,
+    chunk_weeks files at a time, and returns the merged BoxSketch.'''
+
+    handler = DataHandler(data_dir=data_dir)
+    handler.build_file_index()
+    files = handler.file_index.get(region, [])
+    if not files:
+        raise DataHandlerError('No archived data found for ' + region)
+
+    sketch = BoxSketch(edges=edges, k=k)
+    for i in range(0, len(files), chunk_weeks):
+        chunk_df = pd.concat([pd.read_csv(path, index_col=0, parse_dates=True)
+                              for d, path in files[i:i+chunk_weeks]], sort=False)
+        df_5, df_30 = split_resolutions(chunk_df)
+        sketch.update(df_5)
+        sketch.update(df_30)
+
+    return sketch
+
+def plot_box_stats(stats, fname=None):
+    '''Draws a horizontal box plot on its own axis for each dict of box plot
+    stats, saves the figure to fname if given, otherwise shows it, and returns
+    the figure.'''
+
+    fig, axs = plt.subplots(len(stats), squeeze=False, figsize=(8, 1.2 * len(stats) + 0.5))
+    for ax, s in zip(axs[:, 0], stats):
+        ax.bxp([s], orientation='horizontal', showmeans=False)
+        ax.set_yticklabels([s['label']])
+    fig.tight_layout()
+
+    if fname is not None:
+        fig.savefig(fname)
+    else:
+        plt.show()
+    return fig
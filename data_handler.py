@@ -36,6 +36,10 @@ Collect NEM data:
     - To download the data with no NaNs for all states except vic from 2018 and 2019:
     -- h.collect_data(d_start=['2018-01-01', '2019-02-18', '2019-10-28'], d_end=['2019-02-10', '2019-10-20', '2020-01-01'])
 
+Collect NEM data concurrently from a server of weekly archive files:
+    h.loader = AsyncArchiveClient(base_url='http://...', concurrency=16)
+    - see async_client.py, including a local mock server for offline use
+
 Print the data:
     h.print_data(res=5)
     - res options include: 5, 30
@@ -44,51 +48,115 @@ Plot the data:
     h.plot_data()
 
 Make a boxplot of a field or fields:
-    h.boxplot(field='yourfield')
+    h.boxplot(field='yourfield', start=None, end=None, fname=None)
     - field options include: all (attempts to plot all fields in box diagram)
         or any other field in hte dataset
+    - drawn from the stats of h.box_stats(), fname saves the plot to a file
+
+Get the box plot stats (quartiles, whiskers, outliers) of a field or fields:
+    h.box_stats(field='all', start='2019-01-01', end='2019-02-01')
+    - see box_sketch.py, the stats of each field and range are cached
 
 Run checks on the data:
-    h.data_checks()
+    report = h.data_checks(print_op=True, fname=None)
+    - returns a QualityReport, see data_quality.py
+    - fname saves the report as JSON
 
 Get some general information about the data:
     h.data_stats(print_op=True)
 
+Reindex the data to the exact 5 and 30 minute grids and find the NaN gaps:
+    h.regularise_grid()
+    - done by collect_data() for each range unless regularise=False, the
+      periods between ranges are not reindexed
+    - the gaps of each field are stored in h.gap_table
+
 Replace any null values in the data:
     h.replace_null(method='yourmethod')
-    - methods include: 'median', 'interpolate', 'daily_avg', 'weekly_avg'
+    - methods include: 'median', 'interpolate', 'daily_avg', 'weekly_avg', 'by_gap'
+    - by_gap interpolates gaps up to max_interp intervals long and uses the
+      weekly average for longer gaps
+    - parallel=True runs each field in a process pool, workers sets its size
+
+Replace null values of several handlers (e.g. one per region) in one pool:
+    replace_null_parallel([h_sa1, h_vic1], field='all', method='weekly_avg')
+
+Query a time range from the local archive of weekly CSVs in data/power:
+    df = h.query(region='sa1', start='2019-01-01', end='2019-01-04', fields=['PRICE'])
+    - start and end can be 'yyyy-mm-dd' or 'yyyy-mm-dd HH:MM'
+    - fields can be a single field, a list of fields or 'all'
+    - set h.grid_store to a GridStore (see grid_store.py) to serve queries from
+      the memory-mapped binary store instead of the CSVs
+
+Share the data with DataInsights without copying it:
+    i = DataInsights.from_handler(h)
+    - see data_insights.py, call h.clear_cache() after changing h.df_5 or
+      h.df_30 in place
+
+Get a field on a regular 30 minute grid, resampling 5 minute fields:
+    series = grid_30(h.df_5, h.df_30, field='PRICE')
 
 '''
 
 from opennempy import web_api
+import bisect
+from concurrent.futures import ProcessPoolExecutor
 import datetime
+from multiprocessing.shared_memory import SharedMemory
+import os
 import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.font_manager import FontProperties
 import numpy as np
-import seaborn as sns
+
+
+# Each archive file holds one week of data, from 00:05 on the date in its
+# filename up to and including 00:00 seven days later
+ARCHIVE_FILE_SPAN = datetime.timedelta(days=7)
+
+# Fields that are only resolved to 30 minutes, the rest are 5 minute fields
+FIELDS_30 = ['PRICE', 'TEMPERATURE', 'ROOFTOP_SOLAR']
+
+# Columns of the gap tables of NaN runs
+GAP_COLUMNS = ['field', 'res', 'start', 'end', 'length']
+
+# Number of 30 minute slots in a week and a day
+WEEK_SLOTS = 336
+DAY_SLOTS = 48
+
+# replace_null methods that can be run on each field in parallel
+PARALLEL_METHODS = ['zeros', 'median', 'interpolate', 'daily_avg', 'weekly_avg']
 
 
 class DataHandler:
-    def __init__(self):
+    def __init__(self, data_dir='data/power'):
         self.df_5 = pd.DataFrame()
         self.df_30 = pd.DataFrame()
         self.df_stats = pd.DataFrame()
         self.date_df = pd.DataFrame()
+        self.data_dir = data_dir
+        self.file_index = {}
+        self.grid_store = None
+        self.loader = web_api
+        self.gap_table = pd.DataFrame(columns=GAP_COLUMNS)
+        self.cache = {}
 
     def collect_data(self, d_start='2019-01-01', d_end='2019-02-01', region='sa1',
-                    print_op=False, dropna=True):
+                    print_op=False, dropna=True, regularise=True):
         '''This function takes a start dates as a tuple, a end date as a tupe, a
         region as a string and print_op as a boolean. The defaults are to take
         data from the 1/1/2018 to 12/12/2019 from SA. The function downloads 5 and
         30 minute data using the web_api from opennempy, between the d_start and
         d_end ranges from the region given. If the print_op variable is given as
-        True, then the data is printed after being downloaded. If any errors occur,
-        an exception is raised with DataHandlerError.'''
+        True, then the data is printed after being downloaded. If regularise is
+        True, each range is reindexed to the 5 and 30 minute grids after download
+        (see regularise_grid), leaving out the periods between ranges. If any errors occur, an exception is raised with
+        DataHandlerError.'''
 
         # Reset the DFs
         self.df_5 = pd.DataFrame()
         self.df_30 = pd.DataFrame()
+        self.clear_cache()
 
         # Check region exsits
         if region not in ['nsw1', 'qld1', 'sa1','tas1','vic1']:
@@ -122,15 +190,21 @@ class DataHandler:
                 print('- End date: \t' + str(date2))
                 print('- Region: \t' + convert_region_to_string(region))
 
-            # Attempt to download using web_api.load_data(), if there is an issue
-            # it raises a DataHandlerError
+            # Attempt to download using the loader's load_data(), web_api by
+            # default, if there is an issue it raises a DataHandlerError
             try:
-                temp_df_5, temp_df_30 = web_api.load_data(d1=d1, d2=d2, region=region)
+                temp_df_5, temp_df_30 = self.loader.load_data(d1=d1, d2=d2, region=region)
             except:
                 raise DataHandlerError('Issue occurred during download')
 
-            self.df_5 = self.df_5.append(temp_df_5)
-            self.df_30 = self.df_30.append(temp_df_30)
+            # Each range is regularised on its own, so the periods between
+            # ranges are not added back as rows of NaN values
+            if regularise:
+                temp_df_5 = regularise_frame(temp_df_5, '5Min')
+                temp_df_30 = regularise_frame(temp_df_30, '30Min')
+
+            self.df_5 = pd.concat([self.df_5, temp_df_5], sort=False)
+            self.df_30 = pd.concat([self.df_30, temp_df_30], sort=False)
 
         # Removes columns that are only NaN values and prints removed columns
         if dropna:
@@ -142,10 +216,136 @@ class DataHandler:
             if print_op == True:
                 print('- Removed Columns: ', rem_cols)
 
+        # Drops any timestamps repeated by overlapping ranges and stores the
+        # gaps left within each range
+        if regularise:
+            self.df_5 = drop_duplicate_times(self.df_5)
+            self.df_30 = drop_duplicate_times(self.df_30)
+            self.clear_cache()
+            self.find_gaps()
+
         # Prints the data
         if print_op == True:
             print(self.df_5, self.df_30)
 
+    def build_file_index(self):
+        '''Scans data_dir for weekly archive files named <region>_<yyyymmdd>.csv
+        and stores a sorted list of (start date, path) tuples for each region in
+        self.file_index. Only the filenames are read, not the files themselves.'''
+
+        file_index = {}
+        for fname in os.listdir(self.data_dir):
+            name, ext = os.path.splitext(fname)
+            if ext != '.csv' or name.count('_') != 1:
+                continue
+            region, date = name.split('_')
+            try:
+                d = datetime.datetime.strptime(date, '%Y%m%d')
+            except ValueError:
+                continue
+            file_index.setdefault(region, []).append(
+                (d, os.path.join(self.data_dir, fname)))
+
+        for region in file_index:
+            file_index[region].sort()
+        self.file_index = file_index
+
+    def query(self, region='sa1', start='2019-01-01', end='2019-01-08', fields='all'):
+        '''This function takes a region, a start and end date and a field or
+        list of fields and returns a DataFrame of the archived data in data_dir
+        between start and end (inclusive). Only the weekly files that overlap
+        the range are opened, only the requested columns are read and the rows
+        are trimmed using a binary search on the sorted index.'''
+
+        # Check region exsits
+        if region not in ['nsw1', 'qld1', 'sa1','tas1','vic1']:
+            raise DataHandlerError('Region must be one of nsw1, qld1, sa1, tas1, vic1')
+
+        try:
+            start = pd.Timestamp(start)
+            end = pd.Timestamp(end)
+        except ValueError:
+            raise DataHandlerError('Issue with the input dates')
+        if end < start:
+            raise DataHandlerError('end must not be before start')
+
+        # Converts fields variable to a list if not a list
+        if fields != 'all' and type(fields) is not list:
+            fields = [fields]
+
+        # Serve the query from the memory-mapped grid store if it has the data
+        if self.grid_store is not None and self.grid_store.has(region, fields):
+            return self.grid_store.query(region, start, end, fields)
+
+        if not self.file_index:
+            self.build_file_index()
+        files = self.file_index.get(region, [])
+        starts = [d for d, path in files]
+
+        # Files overlap the range if they start before end and finish on or
+        # after start
+        lo = bisect.bisect_left(starts, start - ARCHIVE_FILE_SPAN)
+        hi = bisect.bisect_left(starts, end)
+
+        frames = []
+        for d, path in files[lo:hi]:
+            if fields == 'all':
+                usecols = None
+            else:
+                usecols = lambda c: c in fields or c.startswith('Unnamed')
+            temp_df = pd.read_csv(path, index_col=0, parse_dates=True, usecols=usecols)
+
+            # Trim the rows using binary search on the sorted index
+            i = temp_df.index.searchsorted(start, side='left')
+            j = temp_df.index.searchsorted(end, side='right')
+            frames.append(temp_df.iloc[i:j])
+
+        if not frames:
+            raise DataHandlerError('No archived data found for ' + region +
+                                   ' between ' + str(start) + ' and ' + str(end))
+
+        query_df = pd.concat(frames, sort=False)
+        if fields != 'all':
+            missing = [f for f in fields if f not in list(query_df)]
+            if missing:
+                raise DataHandlerError('Fields not in archive: ' + str(missing))
+            query_df = query_df[fields]
+        query_df.index.name = None
+
+        return query_df
+
+    def regularise_grid(self):
+        '''Reindexes df_5 and df_30 to the exact 5 minute and 30 minute grids
+        between their first and last timestamps, so that timestamps missing
+        from the index become rows of NaN values. Duplicate timestamps are
+        dropped, keeping the first. The NaN runs of every field are then stored
+        in self.gap_table with their start, end and length.'''
+
+        self.df_5 = regularise_frame(self.df_5, '5Min')
+        self.df_30 = regularise_frame(self.df_30, '30Min')
+
+        self.clear_cache()
+        self.find_gaps()
+
+    def clear_cache(self):
+        '''Empties self.cache, the results derived from the data that are
+        shared with any DataInsights built with DataInsights.from_handler().
+        Results are keyed by a hash of the data they use, so this only frees
+        the results of data that has been changed by the methods that call it.'''
+
+        self.cache.clear()
+
+    def find_gaps(self):
+        '''Stores the run-length encoded NaN gaps of each field of df_5 and
+        df_30 in self.gap_table, one row per gap with the field, resolution,
+        start, end and length in intervals.'''
+
+        gaps = [g for g in [gap_table(self.df_5, 5), gap_table(self.df_30, 30)] if not g.empty]
+        if gaps:
+            self.gap_table = pd.concat(gaps, ignore_index=True)
+        else:
+            self.gap_table = pd.DataFrame(columns=GAP_COLUMNS)
+
     def save_clean_data(self, fname):
         '''This function takes a filename as an argument and then combines the
         dataframes into one 30_min reslved dataframe and saves the new dataFrame
@@ -196,9 +396,25 @@ class DataHandler:
 
             plt.show()
 
-    def boxplot(self, field='PRICE'):
+    def boxplot(self, field='PRICE', start=None, end=None, whis=1.5, fname=None):
         '''This function takes a list or single element as the fields and makes
-        a box plot for each of the fields given.'''
+        a box plot for each of the fields given, between start and end if
+        given. The box plots are drawn from the stats of box_stats(), and saved
+        to fname if it is given, otherwise shown.'''
+
+        from box_sketch import plot_box_stats
+
+        return plot_box_stats(self.box_stats(field, start, end, whis), fname)
+
+    def box_stats(self, field='all', start=None, end=None, whis=1.5):
+        '''Returns a list with a dict of box plot stats (see box_sketch.py)
+        for each field given, between start and end if given. Each field is
+        summarised by a BoxSketch in one pass, without sorting its values, and
+        the sketches are cached in self.cache for each field and date range,
+        keyed by a hash of the field (see content_key), so the stats are
+        summarised again whenever its values change, however they are changed.'''
+
+        from box_sketch import BoxSketch
 
         # Gets a list of all fields in the 5min and 30min datasets
         if field == 'all':
@@ -208,52 +424,46 @@ class DataHandler:
         if type(field) is not list:
             field = [field]
 
-        # If there is only one plot to be made
-        if len(field) == 1:
-            if field[0] in list(self.df_5):
-                sns.boxplot(x=self.df_5[field[0]])
-            elif field[0] in list(self.df_30):
-                sns.boxplot(x=self.df_30[field[0]])
-            plt.show()
+        stats = []
+        for f in field:
+            if f in list(self.df_5):
+                df = self.df_5
+            elif f in list(self.df_30):
+                df = self.df_30
+            else:
+                raise DataHandlerError(str(f) + ' does not exist in dataset')
 
-        # If there are multiple plots to be made
-        else:
-            fig, axs = plt.subplots(len(field))
-            for i in range(len(field)):
-                if field[i] in list(self.df_5):
-                    sns.boxplot(x=self.df_5[field[i]], ax=axs[i])
-                elif field[i] in list(self.df_30):
-                    sns.boxplot(x=self.df_30[field[i]], ax=axs[i])
-            fig.tight_layout()
-            plt.show()
+            key = ('box', f, start, end, content_key(df[f]))
+            if key not in self.cache:
+                sketch = BoxSketch()
+                sketch.update(df[[f]].loc[start:end])
+                self.cache[key] = sketch
+            if f in self.cache[key].fields():
+                stats.append(self.cache[key].stats(f, whis))
+        return stats
 
-    def data_checks(self):
-        '''Checks the 5 minute and 30 minute data for any null values and prints
-        the rows of the pandas that have null values present. Also prints the
-        dtypes of each column for user to check incase there are inconsistencies.'''
+    def data_checks(self, print_op=True, fname=None):
+        '''Checks the 5 minute and 30 minute data for NaN values and gaps,
+        duplicate or non-monotonic timestamps, missing intervals, out of range
+        values and mismatches between the two resolutions. Returns the
+        QualityReport (see data_quality.py), prints a summary of it if print_op
+        is True and saves it as JSON if a filename is given as fname.'''
 
-        print('- Performing checks on 5 minute resolved data:')
-        # Checks for any cells with null value and prints all rows with null
-        if self.df_5.isnull().sum().sum() > 0:
-            print('- Found the below missing data:')
-            print(self.df_5[self.df_5.isnull().any(axis=1)])
-        else:
-            print('No NaN or empty values')
-        print('- The types of values in each column are:')
-        # Prints they data types of each column
-        print(self.df_5.dtypes)
+        # Imported here as data_quality imports this module
+        from data_quality import check_frames
 
+        report = check_frames(self.df_5, self.df_30)
 
-        print('- Performing checks on 30 minute resolved data:')
-        # Checks for any cells with null value and prints all rows with null
-        if self.df_30.isnull().sum().sum() > 0:
-            print('- Found the below missing data:')
-            print(self.df_30[self.df_30.isnull().any(axis=1)])
-        else:
-            print('No NaN or empty values')
-        print('- The types of values in each column are:')
-        # Prints they data types of each column
-        print(self.df_30.dtypes)
+        if print_op == True:
+            print('- Performing checks on 5 minute and 30 minute resolved data:')
+            print(report)
+            print('- The types of values in each column are:')
+            print(pd.concat([self.df_5.dtypes, self.df_30.dtypes]))
+
+        if fname is not None:
+            report.to_json(fname)
+
+        return report
 
     def data_stats(self, print_op=True):
         '''This function creates a table for each dataset with the following
@@ -329,15 +539,21 @@ class DataHandler:
         if print_op == True:
             print(self.date_df[self.date_df.isna().any(axis=1)])
 
-    def replace_null(self, field='all', method='weekly_avg'):
+    def replace_null(self, field='all', method='weekly_avg', max_interp=6,
+                     parallel=False, workers=None):
         '''Replaces any NaN or missing values using one of the methods out of
-        median, interpolate, daily_avg or weekly_avg'''
+        median, interpolate, daily_avg, weekly_avg or by_gap. by_gap uses the
+        gap table to linearly interpolate gaps of up to max_interp intervals
+        and fills longer gaps with the weekly average. If parallel is True, the
+        zeros, median, interpolate, daily_avg and weekly_avg methods are run
+        on each field in a pool of workers processes (see
+        replace_null_parallel).'''
 
         # Check that the method given is correct
-        methods = [ 'zeros', 'median', 'interpolate', 'daily_avg', 'weekly_avg', 'delete']
+        methods = [ 'zeros', 'median', 'interpolate', 'daily_avg', 'weekly_avg', 'delete', 'by_gap']
         if method not in methods:
             raise DataHandlerError('Method must be one of: median, interpolate, \
-                                    daily_avg, weekly_avg, zeros or delete')
+                                    daily_avg, weekly_avg, zeros, delete or by_gap')
 
         # Get a list of all fields
         if field == 'all':
@@ -347,6 +563,10 @@ class DataHandler:
         if type(field) is not list:
             field = [field]
 
+        if parallel and method in PARALLEL_METHODS:
+            replace_null_parallel([self], field, method, workers)
+            return
+
         if method == 'delete':
             self.rp_delete(field)
 
@@ -365,40 +585,53 @@ class DataHandler:
         if method == 'interpolate':
             self.rp_interpolate(field)
 
+        if method == 'by_gap':
+            self.rp_by_gap(field, max_interp)
+
     def rp_delete(self, field):
         '''For each field given, removes any rows with a nan.'''
 
+        self.clear_cache()
+        cols_5 = set(self.df_5)
+        cols_30 = set(self.df_30)
         for f in field:
-            if f in list(self.df_5):
+            if f in cols_5:
                 self.df_5 = self.df_5[self.df_5[f].notna()]
-            elif f in list(self.df_30):
+            elif f in cols_30:
                 self.df_30 = self.df_30[self.df_30[f].notna()]
 
     def rp_zeros(self, field):
         '''For each field given, replaces any nan values with 0'''
 
+        self.clear_cache()
+        cols_5 = set(self.df_5)
+        cols_30 = set(self.df_30)
         for f in field:
             # Replace all nan values with 0s
-            if f in list(self.df_5):
-                self.df_5[f].fillna(0, inplace=True)
-            elif f in list(self.df_30):
-                self.df_30[f].fillna(0, inplace=True)
+            if f in cols_5:
+                self.df_5[f] = self.df_5[f].fillna(0)
+            elif f in cols_30:
+                self.df_30[f] = self.df_30[f].fillna(0)
 
     def rp_median(self, field):
         '''For each field given, replaces any nan values with the median value
         of that field'''
 
+        self.clear_cache()
+        cols_5 = set(self.df_5)
+        cols_30 = set(self.df_30)
         for f in field:
             # replace all nan values with the median for that field
-            if f in list(self.df_5):
-                self.df_5[f].fillna(value=self.df_5[f].median(), inplace=True)
-            if f in list(self.df_30):
-                self.df_30[f].fillna(value=self.df_30[f].median(), inplace=True)
+            if f in cols_5:
+                self.df_5[f] = self.df_5[f].fillna(value=self.df_5[f].median())
+            if f in cols_30:
+                self.df_30[f] = self.df_30[f].fillna(value=self.df_30[f].median())
 
     def rp_daily_avg(self, field):
         '''For each field given, replaces any nan values with the mean average
         value for time of the day'''
 
+        self.clear_cache()
         # Get the mean of each field for each day, hour and minute in the data
         # This is returned in a multiIndex dataframe
         df_5_mean = self.df_5.groupby([self.df_5.index.hour,
@@ -414,11 +647,13 @@ class DataHandler:
         df_30_null_dict = {}
         df_5_null_dict = {}
 
+        cols_5 = set(self.df_5)
+        cols_30 = set(self.df_30)
         for f in field:
             # Populate the null_dicts
-            if f in list(self.df_30):
+            if f in cols_30:
                 df_30_null_dict[f] = self.df_30[self.df_30[f].isnull()].index.tolist()
-            if f in list(self.df_5):
+            if f in cols_5:
                 df_5_null_dict[f] = self.df_5[self.df_5[f].isnull()].index.tolist()
 
         # Iterate through each field and index in the dict and replace the
@@ -443,6 +678,7 @@ class DataHandler:
         '''For each field given, replaces any nan values with the mean average
         value for time of the week'''
 
+        self.clear_cache()
         # Get the mean of each field for each day, hour and minute in the data
         # This is returned in a multiIndex dataframe
         df_5_mean = self.df_5.groupby([self.df_5.index.weekday,
@@ -458,11 +694,13 @@ class DataHandler:
         df_30_null_dict = {}
         df_5_null_dict = {}
 
+        cols_5 = set(self.df_5)
+        cols_30 = set(self.df_30)
         for f in field:
             # Populate the null_dicts
-            if f in list(self.df_30):
+            if f in cols_30:
                 df_30_null_dict[f] = self.df_30[self.df_30[f].isnull()].index.tolist()
-            if f in list(self.df_5):
+            if f in cols_5:
                 df_5_null_dict[f] = self.df_5[self.df_5[f].isnull()].index.tolist()
 
         # Iterate through each field and index in the dict and replace the
@@ -485,93 +723,71 @@ class DataHandler:
                 mean_index = str(day) + '_' + str(int(hour)) + '_' + str(int(minute))
                 self.df_5.at[i, k] = df_5_mean[k][mean_index]
 
-    def rp_interpolate(self, field):
-        '''for each field given, replace any NaN values with the interpolated
-        values from the value before and after'''
-
-        # Get the first and last indexes for each dataset
-        df_30_ends = []
-        df_5_ends = []
-        df_30_ends.append(self.df_30.first_valid_index())
-        df_30_ends.append(self.df_30.last_valid_index())
-        df_5_ends.append(self.df_5.first_valid_index())
-        df_5_ends.append(self.df_5.last_valid_index())
+    def rp_by_gap(self, field, max_interp=6):
+        '''For each field given, linearly interpolates the NaN gaps that are no
+        longer than max_interp intervals and replaces the values of any longer
+        gaps with the mean average value for time of the week. Gaps at either
+        end of a range of the data are never interpolated, so they are also
+        filled with the weekly average.'''
 
-        # Init the dicts that will contain the field and indexes of null values
-        df_30_null_dict = {}
-        df_5_null_dict = {}
+        self.clear_cache()
+        self.find_gaps()
+        cols_5 = set(self.df_5)
+        cols_30 = set(self.df_30)
 
+        long_gaps = []
         for f in field:
-            # Populate the null_dicts
-            if f in list(self.df_30):
-                df_30_null_dict[f] = self.df_30[self.df_30[f].isnull()].index.tolist()
-            if f in list(self.df_5):
-                df_5_null_dict[f] = self.df_5[self.df_5[f].isnull()].index.tolist()
+            if f in cols_5:
+                df_name, res = 'df_5', 5
+            elif f in cols_30:
+                df_name, res = 'df_30', 30
+            else:
+                continue
+            df = getattr(self, df_name)
+            gaps = self.gap_table[self.gap_table['field'] == f]
+            if gaps.empty:
+                continue
+
+            # Short gaps with a valid value on both sides, in the same range
+            values = df[f].values.astype(float)
+            breaks = np.append(grid_breaks(df.index, res), True)
+            starts = df.index.get_indexer(gaps['start'])
+            lengths = gaps['length'].values
+            ends = starts + lengths
+            short = (lengths <= max_interp) & (starts > 0) & ~breaks[starts] & ~breaks[ends]
+            if not short.all():
+                long_gaps.append(f)
+            if not short.any():
+                continue
+
+            # Positions of every value in the short gaps
+            starts = starts[short]
+            lengths = lengths[short]
+            offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            pos = np.repeat(starts, lengths) + offsets
+
+            valid = np.flatnonzero(~np.isnan(values))
+            values[pos] = np.interp(pos, valid, values[valid])
+            df[f] = values
+
+        # Fill the remaining gaps with the weekly average
+        if long_gaps:
+            self.rp_weekly_avg(long_gaps)
+        self.find_gaps()
 
-        # Iterate through the null_dict key-value pairs and replace the
-        # null values
-        for k, v in df_30_null_dict.items():
-            for i in v:
-                if i not in df_30_ends:
-                    self.interpolate_normal(k, i, 'df_30')
-                else:
-                    self.interpolate_ends(k, i, 'df_30', df_30_ends.index(i))
+    def rp_interpolate(self, field):
+        '''For each field given, replaces any NaN values by linear
+        interpolation between the valid values before and after, with
+        fill_column() like replace_null_parallel. NaN values before the first
+        or after the last valid value take that value.'''
 
-        # Iterate through the null_dict key-value pairs and replace the
-        # null values
-        for k, v in df_5_null_dict.items():
-            for i in v:
-                if i not in df_5_ends:
-                    self.interpolate_normal(k, i, 'df_5')
-                else:
-                    self.interpolate_ends(k, i, 'df_5', df_5_ends.index(i))
-
-    def interpolate_normal(self, k, i, df_name):
-        '''This function takes a data field as k, and an index value as i, as
-        well as the name of a DataFrame as df_name. It finds the numerical index
-        of the index i and then the previous and next values in column k of
-        index i and determines the mean. The value for column k, index i is then
-        set to the mean value of the next and previous values.'''
-
-        if df_name == 'df_30':
-            loc = self.df_30.index.get_loc(i)
-            prev = self.df_30.iloc[loc-1][k]
-            next = self.df_30.iloc[loc+1][k]
-            mean = (prev + next) * 0.5
-            self.df_30.at[i, k] = mean
-
-        elif df_name == 'df_5':
-            loc = self.df_5.index.get_loc(i)
-            prev = self.df_5.iloc[loc-1][k]
-            next = self.df_5.iloc[loc+1][k]
-            mean = (prev + next) * 0.5
-            self.df_5.at[i, k] = mean
-
-    def interpolate_ends(self, k, i, df_name, end_index):
-        '''This function acts as interpolate_normal, except that the missing
-        value is either at the first or last index of the dataframe. as such, it
-        takes the next or previous value and replaces the NaN value, depending
-        on if the first or last value is missing.'''
-
-        if df_name == 'df_30':
-            if end_index == 0:
-                loc = self.df_30.index.get_loc(i)
-                next = self.df_30.iloc[loc+1][k]
-                self.df_30.at[i, k] = next
-            else:
-                loc = self.df_30.index.get_loc(i)
-                prev = self.df_30.iloc[loc-1][k]
-                self.df_30.at[i, k] = prev
-
-        if df_name == 'df_5':
-            if end_index == 0:
-                loc = self.df_5.index.get_loc(i)
-                next = self.df_5.iloc[loc+1][k]
-                self.df_5.at[i, k] = next
-            else:
-                loc = self.df_5.index.get_loc(i)
-                prev = self.df_5.iloc[loc-1][k]
-                self.df_5.at[i, k] = prev
+        self.clear_cache()
+        for df_name in ['df_5', 'df_30']:
+            df = getattr(self, df_name)
+            for f in [f for f in field if f in set(df)]:
+                values = df[f].to_numpy(dtype=np.float64, copy=True)
+                fill_column(values, 'interpolate')
+                df[f] = values
 
 
 class DataHandlerError(Exception):
@@ -595,5 +811,248 @@ def convert_region_to_string(region):
 
     return return_region
 
+def find_runs(mask, breaks=None):
+    '''Takes a 1D boolean array and returns two numpy arrays holding the start
+    position and length of each run of True values, found without looping.
+    breaks is an optional boolean array of the positions where a new run must
+    start even if the value before is also True.'''
+
+    mask = np.asarray(mask, dtype=np.int8)
+    edges = np.diff(np.concatenate(([0], mask, [0])))
+    if breaks is not None:
+        # A True value after a break that follows another True value ends one
+        # run and starts the next
+        split = np.flatnonzero(np.asarray(breaks, dtype=bool)[1:] & (mask[1:] == 1) & (mask[:-1] == 1)) + 1
+        starts = np.sort(np.concatenate((np.flatnonzero(edges == 1), split)))
+        ends = np.sort(np.concatenate((np.flatnonzero(edges == -1), split)))
+        return starts, ends - starts
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return starts, ends - starts
+
+def grid_breaks(index, res):
+    '''Returns a boolean array that is True at each position of index that is
+    more than res minutes after the timestamp before it, like the first row of
+    each range of a DataFrame collected over several date ranges.'''
+
+    breaks = np.zeros(len(index), dtype=bool)
+    if len(index) > 1:
+        breaks[1:] = np.diff(index.values) != np.timedelta64(res, 'm')
+    return breaks
+
+def gap_table(df, res):
+    '''Takes a DataFrame with res minute resolution and returns a DataFrame
+    with one row per run of NaN values in each field, holding the field, the
+    resolution, the first and last timestamps of the run and its length. Runs
+    are split where the index skips more than res minutes, so a gap never
+    spans two ranges of the data.'''
+
+    nulls = df.isnull()
+    counts = nulls.sum()
+    breaks = grid_breaks(df.index, res)
+    gap_frames = []
+    for f in list(df):
+        if counts[f] == 0:
+            continue
+        starts, lengths = find_runs(nulls[f].values, breaks)
+        gap_frames.append(pd.DataFrame({'field': f, 'res': res, 'start': df.index[starts],
+                          'end': df.index[starts + lengths - 1], 'length': lengths},
+                          columns=GAP_COLUMNS))
+
+    if not gap_frames:
+        return pd.DataFrame(columns=GAP_COLUMNS)
+    return pd.concat(gap_frames, ignore_index=True)
+
+def split_resolutions(df):
+    '''Takes a DataFrame in the layout of the CSV archive, where the 30 minute
+    fields sit on the 5 minute index, and returns it split into a 5 minute and
+    a 30 minute DataFrame like the ones returned by web_api.load_data().'''
+
+    cols_30 = [f for f in list(df) if f in FIELDS_30]
+    cols_5 = [f for f in list(df) if f not in FIELDS_30]
+    df_5 = df[cols_5]
+    df_30 = df.loc[df.index.minute % 30 == 0, cols_30]
+    return df_5, df_30
+
+def content_key(data):
+    '''Returns a key of the index and values of a Series or DataFrame, from a
+    hash of every row, so the key changes whenever a value or timestamp is
+    changed, however it is changed.'''
+
+    hashes = pd.util.hash_pandas_object(data, index=True).to_numpy()
+    columns = tuple(data.columns) if isinstance(data, pd.DataFrame) else data.name
+    return (columns, len(hashes), int(hashes.sum()))
+
+def drop_duplicate_times(df):
+    '''Returns df sorted by its index with duplicate timestamps dropped,
+    keeping the first.'''
+
+    if df.index.has_duplicates:
+        df = df[~df.index.duplicated()]
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+    return df
+
+def regularise_frame(df, freq):
+    '''Returns df reindexed to the exact grid of the pandas frequency freq
+    between its first and last timestamps, with duplicate timestamps dropped,
+    so that timestamps missing from the index become rows of NaN values.'''
+
+    if df.empty:
+        return df
+    df = drop_duplicate_times(df)
+    grid = pd.date_range(df.index[0], df.index[-1], freq=freq)
+    if len(grid) != len(df) or not df.index.equals(grid):
+        df = df.reindex(grid)
+    return df
+
+def grid_30(df_5, df_30, field):
+    '''Returns a field of df_5 or df_30 as a Series on a regular 30 minute grid,
+    resampling 5 minute fields, with NaN for any missing intervals.'''
+
+    if field in list(df_5):
+        series = df_5[field].resample('30Min', label='right', closed='right').mean()
+    elif field in list(df_30):
+        series = df_30[field]
+        series = series[~series.index.duplicated()].sort_index()
+    else:
+        raise DataHandlerError(str(field) + ' does not exist in dataset')
+    grid = pd.date_range(series.index[0], series.index[-1], freq='30Min')
+    return series.reindex(grid)
+
+def minute_of(index, time_len='weeks'):
+    '''Takes a DatetimeIndex and returns a numpy array of the minute of the
+    day (time_len='days') or of the week (time_len='weeks'), starting at
+    Monday 00:00, of each timestamp.'''
+
+    minutes = index.hour.values * 60 + index.minute.values
+    if time_len == 'weeks':
+        minutes = minutes + index.weekday.values * 1440
+    return minutes.astype(np.int64)
+
+def slot_labels(time_len='weeks'):
+    '''Returns the labels of the 30 minute slots of a week ('Mon 00:00' to
+    'Sun 23:30') or a day ('00:00' to '23:30').'''
+
+    times = pd.date_range('2000-01-03', periods=WEEK_SLOTS, freq='30Min')
+    if time_len == 'days':
+        return list(times[:DAY_SLOTS].strftime('%H:%M'))
+    return list(times.strftime('%a %H:%M'))
+
+def fill_column(values, method, slots=None):
+    '''Replaces the NaN values of the 1D float array values in place, using
+    one of the methods zeros, median, interpolate, daily_avg or weekly_avg. For
+    daily_avg and weekly_avg, slots holds the minute of the day or week of each
+    value (see minute_of) and each NaN is replaced by the mean of its slot.
+    interpolate is linear between the nearest valid values on either side,
+    which is the mean of the two neighbours for a single missing value.'''
+
+    nulls = np.isnan(values)
+    if not nulls.any() or nulls.all():
+        return
+    valid = ~nulls
+
+    if method == 'zeros':
+        values[nulls] = 0
+    elif method == 'median':
+        values[nulls] = np.median(values[valid])
+    elif method == 'interpolate':
+        pos = np.flatnonzero(valid)
+        values[nulls] = np.interp(np.flatnonzero(nulls), pos, values[pos])
+    elif method in ['daily_avg', 'weekly_avg']:
+        n_slots = slots.max() + 1
+        sums = np.bincount(slots[valid], weights=values[valid], minlength=n_slots)
+        counts = np.bincount(slots[valid], minlength=n_slots)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts
+        values[nulls] = means[slots[nulls]]
+
+def fill_shared_column(block_name, shape, j, method, slot_name=None):
+    '''Attaches to the shared memory block block_name, a Fortran ordered float
+    array of the given shape, and replaces the NaN values of its column j in
+    place with fill_column(). slot_name is the shared memory block holding the
+    slots of each row for daily_avg and weekly_avg.'''
+
+    block_shm = SharedMemory(name=block_name)
+    slot_shm = SharedMemory(name=slot_name) if slot_name else None
+    try:
+        block = np.ndarray(shape, dtype=np.float64, buffer=block_shm.buf, order='F')
+        slots = None
+        if slot_shm is not None:
+            slots = np.ndarray(shape[0], dtype=np.int64, buffer=slot_shm.buf)
+        fill_column(block[:, j], method, slots)
+        del block, slots
+    finally:
+        block_shm.close()
+        if slot_shm is not None:
+            slot_shm.close()
+
+def replace_null_parallel(handlers, field='all', method='weekly_avg', workers=None):
+    '''Takes a list of DataHandlers, for example one per region, and replaces
+    the NaN values of the given fields of their df_5 and df_30 using one of the
+    methods zeros, median, interpolate, daily_avg or weekly_avg. The fields
+    with NaN values of each DataFrame are copied once into a shared memory
+    block, every field of every DataFrame is then filled in place by a pool of
+    workers processes, and only the filled fields are written back.'''
+
+    if method not in PARALLEL_METHODS:
+        raise DataHandlerError('Method must be one of: ' + ', '.join(PARALLEL_METHODS))
+    if field != 'all' and type(field) is not list:
+        field = [field]
+
+    blocks = []
+    shms = []
+    try:
+        # Copy the fields with NaN values into one shared memory block per
+        # DataFrame, with each field stored contiguously
+        for h in handlers:
+            for df_name in ['df_5', 'df_30']:
+                df = getattr(h, df_name)
+                nulls = df.isnull().any()
+                cols = [f for f in list(df) if nulls[f] and (field == 'all' or f in field)]
+                if not cols:
+                    continue
+
+                shape = (len(df), len(cols))
+                block_shm = SharedMemory(create=True, size=max(8 * shape[0] * shape[1], 1))
+                shms.append(block_shm)
+                block = np.ndarray(shape, dtype=np.float64, buffer=block_shm.buf, order='F')
+                for j, f in enumerate(cols):
+                    block[:, j] = df[f].to_numpy(dtype=np.float64)
+
+                slot_name = None
+                if method in ['daily_avg', 'weekly_avg']:
+                    slot_shm = SharedMemory(create=True, size=max(8 * shape[0], 1))
+                    shms.append(slot_shm)
+                    slots = np.ndarray(shape[0], dtype=np.int64, buffer=slot_shm.buf)
+                    time_len = 'days' if method == 'daily_avg' else 'weeks'
+                    slots[:] = minute_of(df.index, time_len)
+                    slot_name = slot_shm.name
+                    del slots
+
+                blocks.append((h, df_name, cols, block, block_shm.name, slot_name))
+
+        # Fill every field of every DataFrame in the pool
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(fill_shared_column, block_name, block.shape, j, method, slot_name)
+                       for h, df_name, cols, block, block_name, slot_name in blocks
+                       for j in range(len(cols))]
+            for future in futures:
+                future.result()
+
+        # Write the filled fields back
+        for h, df_name, cols, block, block_name, slot_name in blocks:
+            df = getattr(h, df_name)
+            for j, f in enumerate(cols):
+                df[f] = np.array(block[:, j])
+            h.clear_cache()
+
+    finally:
+        blocks = None
+        block = None
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
 if __name__ == "__main__":
     main()
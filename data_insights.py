@@ -8,9 +8,7 @@ market of a region within a given date range in the NEM based on data provided
 by OpenNEM.
 
 ## TODO:
-- Rework plot_scatter() to be able to handle missing data in one of the DFs
 - Histograms of each field
-- collect data from clean_data
 - add an argument for each plot to save the plot
 - minimum price at which each generator has operated at
 
@@ -24,13 +22,39 @@ Set up a DataHandler class object:
 
 Collect NEM data a sample set of NEM data:
     i.collect_data()
+    - takes the same arguments as DataHandler.collect_data()
+
+Share the data of a DataHandler that has already been collected and cleaned:
+    i = DataInsights.from_handler(h)
+    - the DataFrames are shallow copy-on-write copies, so no data is copied
+      unless one side changes it, and the cached resamples, profiles and
+      matrices are shared by every DataInsights built from h until h changes
+      its data. Results are cached by a hash of the fields they use, so a
+      DataInsights that changes its own data gets new results
+
+Use the data of a file saved by DataHandler.save_clean_data():
+    i = DataInsights.from_store('sa1_2019.csv')
+    - the file is read once and shared in the same way by every DataInsights
+      built from it, until the file changes
 
 Plot a scatter plot:
-    i.plot_scatter(x='yourfield', y='yourfield', xy_swap=Flase)
+    i.plot_scatter(x='yourfield', y='yourfield', xy_swap=Flase, mode='scatter')
     - x and y options include: 'DEMAND', 'PRICE' and more depending on your data collected
     - x must be a single field
     - y can be a single field or list of fields
     - xy_swap=True swaps the x and y values
+    - mode options are: 'scatter', 'hexbin' and 'hist2d', the last two plot
+      the counts of binned points and are much faster for years of data
+    - x and y are aligned on their timestamps, missing data is dropped
+
+Get the 2D histogram counts of x against one or more y fields:
+    i.hist2d(x='PRICE', y=['DEMAND', 'WIND'], bins=100)
+
+Get the correlation matrix of all fields:
+    i.correlation(fields='all', method='pearson', regions=None)
+    - method options are: 'pearson' and 'spearman'
+    - regions is a dict of other DataInsights or DataHandlers by name, e.g.
+      {'vic1': i_vic1}, whose fields are included with the name as a prefix
 
 Plot the average data on a daily or weekly average:
     i.plot_avg(field='yourfield', time_len=yourtime', disp_max=True, disp_demand=False)
@@ -39,6 +63,15 @@ Plot the average data on a daily or weekly average:
     - disp_max=True shows the max of each time unit
     - disp_demand=True shows the average demand in yellow
 
+Get the mean, SD, min and max of a field for each 30 minute slot:
+    i.profile(field='PRICE', time_len='weeks')
+
+Plot a field over a long range from a pre-aggregated Pyramid (see pyramid.py):
+    i.pyramid = Pyramid()
+    i.pyramid.update(i.df_5, i.df_30)
+    i.plot_range(field='PRICE', start='2018-01-01', end='2019-01-01', max_points=2000)
+    - the coarsest level with no more than max_points is plotted
+    - once set, the pyramid also serves the 30 minute data of the other plots
 
 Plot the data overlaid on a weekly or daily scale:
     i.plot_overlay(field='yourfield', time_len='yourlength')
@@ -47,76 +80,269 @@ Plot the data overlaid on a weekly or daily scale:
 
 '''
 
+import os
+
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.cm as cm
+from matplotlib.colors import LogNorm
 from matplotlib.font_manager import FontProperties
 import matplotlib.dates as mdates
 
-from data_handler import DataHandler
+from data_handler import DataHandler, content_key
+
+# The data and cache of each file of the clean data store that has been read,
+# by path and modification time. Only the latest version of a file is kept, and
+# at most STORE_CACHE_SIZE files.
+STORE_CACHE = {}
+STORE_CACHE_SIZE = 8
 
 class DataInsights:
     def __init__(self):
         self.df_5 = pd.DataFrame()
-        self.df_5 = pd.DataFrame()
+        self.df_30 = pd.DataFrame()
+        self.cache = {}
+        self.pyramid = None
+
+    def collect_data(self, *args, **kwargs):
+        '''Collects data with DataHandler.collect_data(), which takes the same
+        arguments, and shares it with this DataInsights.'''
+
+        h = DataHandler()
+        h.collect_data(*args, **kwargs)
+        self.share(h.df_5, h.df_30, h.cache)
+
+    @classmethod
+    def from_handler(cls, h):
+        '''Returns a DataInsights that shares the data and the cache of the
+        DataHandler h without copying them.'''
+
+        i = cls()
+        i.share(h.df_5, h.df_30, h.cache)
+        return i
+
+    @classmethod
+    def from_store(cls, fname, data_dir='clean_data'):
+        '''Returns a DataInsights of a file saved by
+        DataHandler.save_clean_data(). The file is only read the first time,
+        later DataInsights of the same file share its data and cache.'''
+
+        path = os.path.join(data_dir, fname)
+        if not os.path.exists(path):
+            raise DataInsightsError('No clean data file at ' + path)
+        key = ('store', path, os.path.getmtime(path))
+        if key not in STORE_CACHE:
+            # Drop older versions of the file, then the files read first
+            for old_key in [k for k in STORE_CACHE if k[1] == path]:
+                del STORE_CACHE[old_key]
+            while len(STORE_CACHE) >= STORE_CACHE_SIZE:
+                del STORE_CACHE[next(iter(STORE_CACHE))]
+            store_df = pd.read_csv(path, index_col=0, parse_dates=True)
+            store_df.index.name = None
+            STORE_CACHE[key] = (store_df, {})
+        store_df, cache = STORE_CACHE[key]
+
+        # Every field of the store is 30 minute resolved
+        i = cls()
+        i.share(pd.DataFrame(), store_df, cache)
+        return i
+
+    def share(self, df_5, df_30, cache):
+        '''Uses shallow copies of df_5 and df_30, which share their data until
+        either side changes it (copy-on-write), and uses cache for the results
+        of the data.'''
+
+        self.df_5 = df_5.copy(deep=False)
+        self.df_30 = df_30.copy(deep=False)
+        self.cache = cache
+
+    def field_key(self, field):
+        '''Returns the key of the current 30 minute data of a field in
+        self.cache, a hash of the pyramid level or the column it is read from.
+        Keys depend only on the data, so DataInsights that share a cache share
+        results only while their data is the same, however either changes it.'''
+
+        if self.pyramid is not None and field in list(self.pyramid.levels['30Min']['sum']):
+            level = self.pyramid.levels['30Min']
+            return ('pyramid', content_key(level['sum'][field]), content_key(level['count'][field]))
+        if field in list(self.df_5):
+            return ('df_5', content_key(self.df_5[field]))
+        if field in list(self.df_30):
+            return ('df_30', content_key(self.df_30[field]))
+        raise DataInsightsError(str(field) + ' does not exist in dataset')
+
+    def data_key(self, fields):
+        '''Returns the key of the current data of the given fields.'''
+
+        return tuple(self.field_key(f) for f in fields)
+
+    def series_30(self, field):
+        '''Returns the 30 minute resolved series of a field, resampling 5
+        minute fields to 30 minutes. The 30 minute level of self.pyramid is used
+        if a Pyramid has been set, otherwise the resampled series are cached.'''
+
+        if self.pyramid is not None and field in list(self.pyramid.levels['30Min']['sum']):
+            key = ('pyramid', field, self.field_key(field))
+            if key not in self.cache:
+                self.cache[key] = self.pyramid.level('30Min', 'mean')[field]
+            return self.cache[key]
+
+        if field in list(self.df_5):
+            key = ('30Min', field, self.field_key(field))
+            if key not in self.cache:
+                self.cache[key] = self.df_5[field].resample('30Min', label='right', closed='right').mean()
+            return self.cache[key]
+        elif field in list(self.df_30):
+            return self.df_30[field]
+        else:
+            raise DataInsightsError(str(field) + ' does not exist in dataset')
+
+    def aligned(self, fields):
+        '''Returns a DataFrame of the 30 minute resolved fields aligned on their
+        timestamps, dropping any timestamp where a field is missing.'''
+
+        aligned_df = pd.concat([self.series_30(f).rename(f) for f in fields], axis=1,
+                               join='inner')
+        return aligned_df.dropna()
+
+    def hist2d(self, x='PRICE', y='DEMAND', bins=100):
+        '''Returns a dict with the 2D histogram (counts, x_edges, y_edges) of x
+        against each of the y fields, with x and y aligned on their timestamps.'''
+
+        # Converts y variable to a list if not a list
+        if type(y) is not list:
+            y = [y]
 
-    def collect_data(self):
-        DataHandler.collect_data(self)
+        key = ('hist2d', x, tuple(y), bins, self.data_key([x] + y))
+        if key not in self.cache:
+            aligned_df = self.aligned([x] + y)
+            x_values = aligned_df[x].values
+            self.cache[key] = {item: np.histogram2d(x_values, aligned_df[item].values, bins=bins)
+                               for item in y}
+        return self.cache[key]
+
+    def correlation(self, fields='all', method='pearson', regions=None):
+        '''Returns the correlation matrix of the given fields as a DataFrame,
+        computed in one call on the 30 minute resolved fields aligned on their
+        timestamps. method is 'pearson' or 'spearman'. regions is a dict of
+        other DataInsights or DataHandlers by name whose fields are included,
+        prefixed by their name. The matrices are cached.'''
+
+        if method not in ['pearson', 'spearman']:
+            raise DataInsightsError("method must be 'pearson' or 'spearman'")
+
+        # Fields with no data at all would leave no aligned timestamps
+        if fields == 'all':
+            fields = list(self.df_5) + list(self.df_30)
+            fields = [f for f in fields if self.series_30(f).notna().any()]
+        if type(fields) is not list:
+            fields = [fields]
+        if regions is None:
+            regions = {}
+
+        # DataHandlers share their data and cache with a DataInsights, so every
+        # region is keyed by its current data like this one
+        regions = {name: r if isinstance(r, DataInsights) else DataInsights.from_handler(r)
+                   for name, r in regions.items()}
+        key = ('corr', tuple(fields), method, self.data_key(fields),
+               tuple((name, r.data_key([f for f in fields if f in list(r.df_5) + list(r.df_30)]))
+                     for name, r in regions.items()))
+        if key in self.cache:
+            return self.cache[key]
+
+        frames = [self.aligned(fields)]
+        for name, r in regions.items():
+            r_fields = [f for f in fields if f in list(r.df_5) + list(r.df_30)
+                        and r.series_30(f).notna().any()]
+            frames.append(r.aligned(r_fields).add_prefix(name + '_'))
+        corr_df = pd.concat(frames, axis=1, join='inner').dropna()
+
+        values = corr_df.values
+        if method == 'spearman':
+            values = corr_df.rank().values
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = np.corrcoef(values, rowvar=False)
+
+        self.cache[key] = pd.DataFrame(corr, index=list(corr_df), columns=list(corr_df))
+        return self.cache[key]
+
+    def profile(self, field='DEMAND', time_len='weeks'):
+        '''Returns a DataFrame of the mean, standard deviation, min and max of
+        the 30 minute resolved field for each 30 minute slot of the week or
+        day. The profiles are cached.'''
 
-    def plot_scatter(self, x='PRICE', y='DEMAND', xy_swap=False):
+        # Check that the given time_len is valid
+        if time_len not in ['weeks', 'days']:
+            raise DataInsightsError("time_len must be 'days' or 'weeks'")
+
+        key = ('profile', field, time_len, self.field_key(field))
+        if key not in self.cache:
+            temp_df = self.series_30(field)
+            if time_len == 'weeks':
+                grouped = temp_df.groupby([temp_df.index.weekday, temp_df.index.hour, temp_df.index.minute])
+            else:
+                grouped = temp_df.groupby([temp_df.index.hour, temp_df.index.minute])
+            self.cache[key] = pd.DataFrame({'Mean': grouped.mean(), 'SD': grouped.std(),
+                                            'Min': grouped.min(), 'Max': grouped.max()})
+        return self.cache[key]
+
+    def plot_scatter(self, x='PRICE', y='DEMAND', xy_swap=False, mode='scatter', bins=100):
         '''This function creates a scatter plot of the fields given by arguments
         x and y. x is a single field, whereas y can be a single field or a list
         of fields. xy_swap=True swaps the plots x and y axes and allows the x
-        axis to have multiple datasets plot.'''
+        axis to have multiple datasets plot. x and y are aligned on their
+        timestamps. mode='hexbin' or mode='hist2d' plots the counts of the
+        points in bins instead of every point, on one subplot per y field.'''
+
+        # Check that the given mode is valid
+        if mode not in ['scatter', 'hexbin', 'hist2d']:
+            raise DataInsightsError("mode must be 'scatter', 'hexbin' or 'hist2d'")
 
         # Converts y variable to a list if not a list
         if type(y) is not list:
             y = [y]
 
-        # Get the x variable in list form, resamples to 30Min if required
-        if x in list(self.df_5):
-            x_list = self.df_5[x].resample('30Min', label='right', closed='right').mean().to_list()
-        elif x in list(self.df_30):
-            x_list = self.df_30[x].to_list()
-        else:
-            raise DataInsightsError('x does not exist in dataset')
-
-        # Get the y variables in list form, sotred in a list, resamples to
+        # Get the x and y variables aligned on their timestamps, resampled to
         # 30Min if required
-        y_list = []
-        for item in y:
-            if item in list(self.df_5):
-                y_list.append(self.df_5[item].resample('30Min', label='right', closed='right').mean().to_list())
-            elif item in list(self.df_30):
-                y_list.append(self.df_30[item].to_list())
-            else:
-                raise DataInsightsError('y does not exist in dataset')
-
-        # Make sure x and y are the same length
-        for item in y_list:
-            if len(x_list) != len(item):
-                raise DataInsightsError('x and y are not same len, check your data!')
+        aligned_df = self.aligned([x] + y)
 
         # Make the plot and set title and labels, swaps x and y if xy_swap=True
-        if xy_swap == False:
-            for i in range(len(y_list)):
-                plt.scatter(x=x_list, y=y_list[i], label=y[i])
-                plt.xlabel(x)
+        if mode == 'scatter':
+            for item in y:
+                if xy_swap == False:
+                    plt.scatter(x=aligned_df[x].values, y=aligned_df[item].values, label=item)
+                    plt.xlabel(x)
+                else:
+                    plt.scatter(x=aligned_df[item].values, y=aligned_df[x].values, label=item)
+                    plt.ylabel(x)
+            plt.title('A scatter plot of items in the legend')
+            plt.legend()
 
-        # swaps the x and y values
+        # Plot the binned counts of each y field on its own subplot
         else:
-            y_temp = x_list
-            x_list = y_list
-            y_list = y_temp
-
-            for i in range(len(x_list)):
-                plt.scatter(x=x_list[i], y=y_list, label=y[i])
-                plt.ylabel(x)
+            fig, axs = plt.subplots(len(y), squeeze=False)
+            hists = self.hist2d(x, y, bins) if mode == 'hist2d' else None
+            for i, item in enumerate(y):
+                ax = axs[i][0]
+                if mode == 'hexbin':
+                    xs, ys = aligned_df[x].values, aligned_df[item].values
+                    if xy_swap:
+                        xs, ys = ys, xs
+                    im = ax.hexbin(xs, ys, gridsize=bins, mincnt=1, bins='log')
+                else:
+                    counts, x_edges, y_edges = hists[item]
+                    counts = np.ma.masked_equal(counts, 0)
+                    if xy_swap:
+                        im = ax.pcolormesh(y_edges, x_edges, counts, norm=LogNorm())
+                    else:
+                        im = ax.pcolormesh(x_edges, y_edges, counts.T, norm=LogNorm())
+                ax.set_xlabel(item if xy_swap else x)
+                ax.set_ylabel(x if xy_swap else item)
+                fig.colorbar(im, ax=ax, label='Count')
+            axs[0][0].set_title('Counts of binned points of ' + x + ' and ' + ', '.join(y))
+            fig.tight_layout()
 
-        # Set the plot settings
-        plt.title('A scatter plot of items in the legend')
-        plt.legend()
         plt.show()
 
     def plot_avg(self, field='DEMAND', time_len='weeks', disp_max=True, disp_demand=False):
@@ -128,50 +354,17 @@ class DataInsights:
         if time_len not in ['weeks', 'days']:
             raise DataInsightsError("time_len must be 'days' or 'weeks'")
 
-        # Create a temporary pandas series to resample data if required. Also
-        # acts as a check that the field given to function is valid
-        if field in list(self.df_5):
-            temp_df = self.df_5[field].resample('30Min', label='right', closed='right').mean()
-        elif field in list(self.df_30):
-            temp_df = self.df_30[field]
-        else:
-            raise DataInsightsError('Field not in dataset')
-
-        # Resample demand
-        if disp_demand == True:
-            demand = self.df_5['DEMAND'].resample('30Min', label='right', closed='right').mean()
-
-        # Create a temporary empty dataframe to host the relevant data
-        columns = ['Mean', 'SD', 'Min', 'Max']
-        plot_df = pd.DataFrame(columns=columns)
-
         # Get the mean, std, min and max for each 30 min interval in the week
-        # also add a new column to be used for the index later
-        if time_len == 'weeks':
-            plot_df['Mean'] = temp_df.groupby([temp_df.index.weekday, temp_df.index.hour, temp_df.index.minute]).mean()
-            plot_df['SD'] = temp_df.groupby([temp_df.index.weekday, temp_df.index.hour, temp_df.index.minute]).std()
-            plot_df['Min'] = temp_df.groupby([temp_df.index.weekday, temp_df.index.hour, temp_df.index.minute]).min()
-            if disp_max == True:
-                plot_df['Max'] = temp_df.groupby([temp_df.index.weekday, temp_df.index.hour, temp_df.index.minute]).max()
-            plot_df['Hour'] = self.gen_date('weeks')
-
-            # Display demand
-            if disp_demand == True:
-                plot_df['Demand'] = demand.groupby([demand.index.weekday, demand.index.hour, demand.index.minute]).mean()
-
-        # Get the mean, std, min and max for each 30 min interval in the day
-        # also add a new column to be used for the index later
-        if time_len == 'days':
-            plot_df['Mean'] = temp_df.groupby([temp_df.index.hour, temp_df.index.minute]).mean()
-            plot_df['SD'] = temp_df.groupby([temp_df.index.hour, temp_df.index.minute]).std()
-            if disp_max == True:
-                plot_df['Max'] = temp_df.groupby([temp_df.index.hour, temp_df.index.minute]).max()
-            plot_df['Min'] = temp_df.groupby([temp_df.index.hour, temp_df.index.minute]).min()
-            plot_df['Hour'] = self.gen_date('days')
+        # or day from the cached profile of the field, also add a new column to
+        # be used for the index later
+        plot_df = self.profile(field, time_len).copy()
+        if disp_max == False:
+            plot_df['Max'] = np.nan
+        plot_df['Hour'] = self.gen_date(time_len)
 
-            # Display demand
-            if disp_demand == True:
-                plot_df['Demand'] = demand.groupby([demand.index.hour, demand.index.minute]).mean()
+        # Display demand
+        if disp_demand == True:
+            plot_df['Demand'] = self.profile('DEMAND', time_len)['Mean']
 
         # Reset the index to the 'Hours' column
         plot_df.set_index('Hour', inplace=True)
@@ -208,14 +401,9 @@ class DataInsights:
         if time_len not in ['weeks', 'days']:
             raise DataInsightsError("time_len must be 'days' or 'weeks'")
 
-        # Create a temporary pandas series to resample data if required. Also
+        # Get the 30 minute series of the field, resampling if required. Also
         # acts as a check that the field given to function is valid
-        if field in list(self.df_5):
-            temp_df = self.df_5[field].resample('30Min', label='right', closed='right').mean()
-        elif field in list(self.df_30):
-            temp_df = self.df_30[field]
-        else:
-            raise DataInsightsError('Field not in dataset')
+        temp_df = self.series_30(field)
 
         # Split the data into a list of weeks
         if time_len == 'days':
@@ -230,16 +418,11 @@ class DataInsights:
             first = str(week.first_valid_index()).split(' ')[0]
             last = str(week.last_valid_index()).split(' ')[0]
             labels.append(str(first) + ' ' + str(last))
-            week_index = []
-            week_data = []
-            for index, row in week.iteritems():
-                if time_len == 'days':
-                    week_index.append(index.hour + (index.minute/60))
-                else:
-                    week_index.append((index.dayofweek*24) + index.hour + (index.minute/60))
-                week_data.append(row)
-            indexes.append(week_index)
-            y_data.append(week_data)
+            week_index = week.index.hour + week.index.minute / 60
+            if time_len == 'weeks':
+                week_index = week_index + week.index.dayofweek * 24
+            indexes.append(np.asarray(week_index))
+            y_data.append(week.values)
 
         # iterate through the lists of data/labels and plot each
         for j in range(len(labels)):
@@ -254,6 +437,29 @@ class DataInsights:
         plt.legend(loc='upper right', fancybox=True, prop=fontP)
         plt.show()
 
+    def plot_range(self, field='PRICE', start='2018-01-01', end='2019-01-01', max_points=2000):
+        '''Plots the mean of a field between start and end with a band between
+        its min and max, read from the coarsest level of self.pyramid that has
+        no more than max_points intervals in the range.'''
+
+        if self.pyramid is None:
+            raise DataInsightsError('Set self.pyramid to a Pyramid to plot a range')
+
+        level = self.pyramid.pick_level(start, end, max_points)
+        mean = self.pyramid.query(field, start, end, 'mean', level=level)
+        low = self.pyramid.query(field, start, end, 'min', level=level)
+        high = self.pyramid.query(field, start, end, 'max', level=level)
+
+        plt.fill_between(mean.index, low.values, high.values, alpha=0.3, label='Min to Max')
+        plt.plot(mean, 'k-', label='Mean')
+        plt.xlabel('DateTime')
+        plt.ylabel(str(field))
+        plt.title('A plot of ' + str(field) + ' at ' + level + ' resolution')
+        fontP = FontProperties()
+        fontP.set_size('x-small')
+        plt.legend(loc='upper right', fancybox=True, prop=fontP)
+        plt.show()
+
     def gen_date(self, time_len):
         '''A simple function to generate a datetime for the plot_avg() function
         depending on if the time_len is 'days' or 'weeks'. '''
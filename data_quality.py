@@ -0,0 +1,294 @@
+'''
+See the README for more detail about the general project.
+
+This script contains a validation engine that checks the 5 minute and 30 minute
+NEM data and returns a compact QualityReport instead of printing the offending
+rows. Every check is a vectorized pass over the index or the values of a
+DataFrame:
+- NaN counts and run-length encoded NaN gaps (start, end, length) per field
+- Duplicate and non-monotonic timestamps
+- Intervals missing from the 5 minute and 30 minute grids
+- Negative demand and other out-of-range values
+- Mismatches between the 5 minute and 30 minute data
+
+Reports of consecutive chunks can be merged, so the whole CSV archive can be
+checked a few weeks at a time without loading it all into memory.
+
+## Use Case:
+
+Import the functions from data_quality.py:
+    from data_quality import check_frames, check_archive
+
+Check the data of a DataHandler:
+    report = check_frames(h.df_5, h.df_30)
+    print(report)
+    report.to_json('report.json')
+
+Check the archive of a region in data/power, four weeks at a time:
+    report = check_archive(region='sa1', data_dir='data/power', chunk_weeks=4)
+
+'''
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from data_handler import DataHandler, DataHandlerError, GAP_COLUMNS, gap_table, split_resolutions
+
+# The (min, max) allowed for each field, None means unbounded. Fields that are
+# not listed are not range checked.
+DEFAULT_LIMITS = {
+    'DEMAND': (0, None),
+    'PRICE': (-1000, 15000),
+    'TEMPERATURE': (-20, 55),
+    'ROOFTOP_SOLAR': (0, None),
+}
+
+MISSING_COLUMNS = ['res', 'start', 'end', 'length']
+
+
+class QualityReport:
+    def __init__(self):
+        self.rows = {5: 0, 30: 0}
+        self.first = {5: None, 30: None}
+        self.last = {5: None, 30: None}
+        self.nan_counts = {}
+        self.out_of_range = {}
+        self.duplicates = {5: 0, 30: 0}
+        self.non_monotonic = {5: 0, 30: 0}
+        self.res_mismatches = 0
+        self.gaps = pd.DataFrame(columns=GAP_COLUMNS)
+        self.missing = pd.DataFrame(columns=MISSING_COLUMNS)
+
+    def merge(self, other):
+        '''Merges the report of the chunk that follows this one into this
+        report. Gaps and missing intervals that run across the boundary of the
+        two chunks are joined into one span.'''
+
+        for res in [5, 30]:
+            step = pd.Timedelta(minutes=res)
+            self.rows[res] += other.rows[res]
+            self.duplicates[res] += other.duplicates[res]
+            self.non_monotonic[res] += other.non_monotonic[res]
+
+            # Intervals missing between the end of this chunk and the start of
+            # the next one
+            if self.last[res] is not None and other.first[res] is not None:
+                n_missing = (other.first[res] - self.last[res]) // step - 1
+                if n_missing > 0:
+                    span = pd.DataFrame([[res, self.last[res] + step,
+                                          other.first[res] - step, n_missing]],
+                                        columns=MISSING_COLUMNS)
+                    self.missing = concat_spans(self.missing, span, 'res')
+                elif n_missing < 0:
+                    self.non_monotonic[res] += 1
+
+            if self.first[res] is None:
+                self.first[res] = other.first[res]
+            if other.last[res] is not None:
+                self.last[res] = other.last[res]
+
+        for f, n in other.nan_counts.items():
+            self.nan_counts[f] = self.nan_counts.get(f, 0) + n
+        for f, n in other.out_of_range.items():
+            self.out_of_range[f] = self.out_of_range.get(f, 0) + n
+        self.res_mismatches += other.res_mismatches
+
+        self.gaps = concat_spans(self.gaps, other.gaps, 'field')
+        self.missing = concat_spans(self.missing, other.missing, 'res')
+        return self
+
+    def to_dict(self):
+        '''Returns the report as a dict of JSON serialisable values.'''
+
+        return {
+            'rows': self.rows,
+            'first': {k: str(v) for k, v in self.first.items()},
+            'last': {k: str(v) for k, v in self.last.items()},
+            'nan_counts': {k: int(v) for k, v in self.nan_counts.items()},
+            'out_of_range': {k: int(v) for k, v in self.out_of_range.items()},
+            'duplicates': self.duplicates,
+            'non_monotonic': self.non_monotonic,
+            'res_mismatches': int(self.res_mismatches),
+            'gaps': [[f, int(r), str(s), str(e), int(n)] for f, r, s, e, n in self.gaps.values],
+            'missing': [[int(r), str(s), str(e), int(n)] for r, s, e, n in self.missing.values],
+        }
+
+    def to_json(self, fname=None):
+        '''Returns the report as a JSON string, and saves it to fname if given.'''
+
+        report_json = json.dumps(self.to_dict(), indent=1)
+        if fname is not None:
+            with open(fname, 'w') as fp:
+                fp.write(report_json)
+        return report_json
+
+    def is_clean(self):
+        '''Returns True if none of the checks found a problem.'''
+
+        return (sum(self.nan_counts.values()) == 0 and
+                sum(self.out_of_range.values()) == 0 and
+                sum(self.duplicates.values()) == 0 and
+                sum(self.non_monotonic.values()) == 0 and
+                self.res_mismatches == 0 and self.missing.empty)
+
+    def __str__(self):
+        lines = []
+        for res in [5, 30]:
+            lines.append('- ' + str(res) + ' minute data: ' + str(self.rows[res]) +
+                         ' rows from ' + str(self.first[res]) + ' to ' + str(self.last[res]))
+            lines.append('  duplicate timestamps: ' + str(self.duplicates[res]) +
+                         ', non-monotonic timestamps: ' + str(self.non_monotonic[res]))
+            missing = self.missing[self.missing['res'] == res]
+            lines.append('  missing intervals: ' + str(int(missing['length'].sum())) +
+                         ' in ' + str(len(missing)) + ' spans')
+        lines.append('- 5/30 minute mismatches: ' + str(self.res_mismatches))
+        for f, n in self.nan_counts.items():
+            if n > 0:
+                f_gaps = self.gaps[self.gaps['field'] == f]
+                lines.append('- ' + f + ': ' + str(n) + ' NaN in ' + str(len(f_gaps)) +
+                             ' gaps, longest ' + str(int(f_gaps['length'].max())))
+        for f, n in self.out_of_range.items():
+            if n > 0:
+                lines.append('- ' + f + ': ' + str(n) + ' values out of range')
+        return '\n'.join(lines)
+
+
+def concat_spans(spans, other, key):
+    '''Appends the spans of other to spans, joining the last span of spans and
+    the first span of other with the same key if the two are adjacent.'''
+
+    if other.empty:
+        return spans
+    if spans.empty:
+        return other.sort_values([key, 'start'], kind='stable', ignore_index=True)
+
+    spans = spans.reset_index(drop=True)
+    other = other.reset_index(drop=True)
+    drop = []
+    for k in other[key].unique():
+        prev = spans.index[spans[key] == k]
+        if len(prev) == 0:
+            continue
+        p = prev[-1]
+        n = other.index[other[key] == k][0]
+        step = pd.Timedelta(minutes=int(other.at[n, 'res']))
+        if spans.at[p, 'end'] + step == other.at[n, 'start']:
+            spans.at[p, 'end'] = other.at[n, 'end']
+            spans.at[p, 'length'] += other.at[n, 'length']
+            drop.append(n)
+
+    spans = pd.concat([spans, other.drop(index=drop)], ignore_index=True)
+    return spans.sort_values([key, 'start'], kind='stable', ignore_index=True)
+
+def check_frame(df, res, limits, report):
+    '''Runs the single resolution checks on df, a DataFrame with res minute
+    resolution, and stores the results in report.'''
+
+    if df.empty:
+        return
+
+    step = pd.Timedelta(minutes=res)
+    index = df.index
+    report.rows[res] = len(df)
+    report.first[res] = index[0]
+    report.last[res] = index[-1]
+
+    # Duplicate and non-monotonic timestamps
+    diffs = np.diff(index.values.astype('datetime64[ns]').astype(np.int64))
+    report.duplicates[res] = int((diffs == 0).sum())
+    report.non_monotonic[res] = int((diffs < 0).sum())
+
+    # Intervals missing from the grid, found from the steps in the index that
+    # are longer than the resolution
+    step_ns = step.value
+    jumps = np.flatnonzero(diffs > step_ns)
+    if len(jumps):
+        lengths = diffs[jumps] // step_ns - 1
+        starts = index[jumps] + step
+        ends = index[jumps + 1] - step
+        missing = pd.DataFrame({'res': res, 'start': starts, 'end': ends,
+                                'length': lengths}, columns=MISSING_COLUMNS)
+        report.missing = concat_spans(report.missing, missing[missing['length'] > 0], 'res')
+
+    # NaN counts and NaN gaps of each field
+    counts = df.isnull().sum()
+    for f in list(df):
+        report.nan_counts[f] = int(counts[f])
+    report.gaps = concat_spans(report.gaps, gap_table(df, res), 'field')
+
+    # Values outside of the limits of each field
+    for f, (lo, hi) in limits.items():
+        if f not in list(df):
+            continue
+        values = df[f].values
+        bad = np.zeros(len(values), dtype=bool)
+        if lo is not None:
+            bad |= values < lo
+        if hi is not None:
+            bad |= values > hi
+        report.out_of_range[f] = int(bad.sum())
+
+def check_frames(df_5, df_30, limits=DEFAULT_LIMITS, tolerance=0.01):
+    '''This function takes a 5 minute and a 30 minute DataFrame and returns a
+    QualityReport of the checks on each of them, as well as a count of the
+    mismatches between the two resolutions. A mismatch is a 30 minute interval
+    that has data in one DataFrame but not in the other, or a field in both
+    DataFrames where the 30 minute mean of the 5 minute values differs from the
+    30 minute value by more than tolerance (relative).'''
+
+    report = QualityReport()
+    check_frame(df_5, 5, limits, report)
+    check_frame(df_30, 30, limits, report)
+
+    if df_5.empty or df_30.empty:
+        return report
+
+    # Label the 5 minute rows with the end of their 30 minute interval
+    df_5 = df_5[~df_5.index.duplicated()]
+    df_30 = df_30[~df_30.index.duplicated()]
+    mean_5 = df_5.resample('30Min', label='right', closed='right').mean()
+    count_5 = df_5.iloc[:, 0].resample('30Min', label='right', closed='right').size()
+
+    # Only compare the range covered by both DataFrames
+    lo = max(mean_5.index[0], df_30.index[0])
+    hi = min(mean_5.index[-1], df_30.index[-1])
+    count_5 = count_5[lo:hi]
+    in_30 = count_5.index.isin(df_30.index[(df_30.index >= lo) & (df_30.index <= hi)])
+    mismatches = int(((count_5.values > 0) != in_30).sum())
+
+    # Compare the fields found in both resolutions
+    shared = [f for f in list(df_30) if f in list(df_5)]
+    if shared:
+        a = mean_5.loc[lo:hi, shared].reindex(df_30.loc[lo:hi].index)
+        b = df_30.loc[lo:hi, shared]
+        diff = (a - b).abs() > tolerance * b.abs()
+        mismatches += int(diff.values.sum())
+
+    report.res_mismatches = mismatches
+    return report
+
+def check_archive(region='sa1', data_dir='data/power', chunk_weeks=4,
+                  limits=DEFAULT_LIMITS, tolerance=0.01):
+    '''This function checks the weekly CSV archive of a region, chunk_weeks
+    files at a time, and returns the merged QualityReport.'''
+
+    handler = DataHandler(data_dir=data_dir)
+    handler.build_file_index()
+    files = handler.file_index.get(region, [])
+    if not files:
+        raise DataHandlerError('No archived data found for ' + region)
+
+    report = None
+    for i in range(0, len(files), chunk_weeks):
+        chunk_df = pd.concat([pd.read_csv(path, index_col=0, parse_dates=True)
+                              for d, path in files[i:i+chunk_weeks]], sort=False)
+        df_5, df_30 = split_resolutions(chunk_df)
+        chunk_report = check_frames(df_5, df_30, limits, tolerance)
+        if report is None:
+            report = chunk_report
+        else:
+            report.merge(chunk_report)
+
+    return report
@@ -0,0 +1,246 @@
+'''
+See the README for more detail about the general project.
+
+This script contains baseline price and demand forecasting models and a rolling
+origin backtester, for training and evaluating the battery controller.
+
+Every model forecasts the next horizon 30 minute intervals from each of many
+forecast origins at once, with array operations rather than a loop over the
+origins:
+- SeasonalNaive repeats the value from one day or one week before
+- ProfileMean uses the mean of all past values in the same slot of the day or
+  week, kept as running sums per slot like rp_daily_avg and rp_weekly_avg
+- LagRegression is a linear regression on lagged values, with one model per
+  horizon fitted on every interval before the origin. The normal equations are
+  kept as running sums, so each refit is a small solve instead of a fit from
+  scratch.
+
+The backtester splits the origins of each series into chunks and runs every
+(series, model, chunk) in a process pool, then reports the MAE and RMSE of each
+model for each horizon and for each slot of the day.
+
+## Use Case:
+
+Import the functions and classes from forecasting.py:
+    from forecasting import SeasonalNaive, ProfileMean, LagRegression, backtest
+
+Get a field of a DataHandler on a regular 30 minute grid:
+    price = grid_30(h.df_5, h.df_30, 'PRICE')
+    - see data_handler.py
+
+Backtest the models on one or more series:
+    models = {'naive_day': SeasonalNaive('days'), 'naive_week': SeasonalNaive('weeks'),
+              'profile': ProfileMean('weeks'), 'lags': LagRegression()}
+    by_horizon, by_slot = backtest({'sa1_PRICE': price}, models, horizon=48,
+                                   start=336*4, step=1, workers=4)
+
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from data_handler import DataHandlerError, minute_of, slot_labels, WEEK_SLOTS, DAY_SLOTS
+
+
+class SeasonalNaive:
+    def __init__(self, time_len='days'):
+        '''time_len is the season, 'days' or 'weeks'.'''
+
+        if time_len not in ['days', 'weeks']:
+            raise DataHandlerError("time_len must be 'days' or 'weeks'")
+        self.period = DAY_SLOTS if time_len == 'days' else WEEK_SLOTS
+        self.min_history = self.period
+
+    def forecast(self, y, slots, origins, horizon):
+        '''Returns the forecasts (origins x horizon) of the intervals after each
+        origin, using the value of the same slot in the last season. Intervals
+        with no value a season before are NaN.'''
+
+        idx = seasonal_index(origins, horizon, self.period)
+        return np.where(idx >= 0, y[np.clip(idx, 0, None)], np.nan)
+
+
+class ProfileMean:
+    def __init__(self, time_len='weeks'):
+        '''time_len is the profile, 'days' or 'weeks'.'''
+
+        if time_len not in ['days', 'weeks']:
+            raise DataHandlerError("time_len must be 'days' or 'weeks'")
+        self.period = DAY_SLOTS if time_len == 'days' else WEEK_SLOTS
+        self.min_history = self.period
+
+    def forecast(self, y, slots, origins, horizon):
+        '''Returns the forecasts (origins x horizon) of the intervals after each
+        origin, using the mean of all values of the same slot up to the origin.
+        Slots with no value before the origin are NaN.'''
+
+        slot = slots % self.period
+        valid = ~np.isnan(y)
+
+        # Running sum and count of each slot, found by sorting the intervals by
+        # slot and taking a cumulative sum within each slot
+        order = np.argsort(slot, kind='stable')
+        sums = np.cumsum(np.where(valid, y, 0.0)[order])
+        counts = np.cumsum(valid[order])
+        starts = np.searchsorted(slot[order], slot[order], side='left')
+        sums -= np.concatenate(([0.0], sums))[starts]
+        counts -= np.concatenate(([0], counts))[starts]
+
+        running_sum = np.empty(len(y))
+        running_count = np.empty(len(y))
+        running_sum[order] = sums
+        running_count[order] = counts
+
+        idx = seasonal_index(origins, horizon, self.period)
+        past = idx >= 0
+        idx = np.clip(idx, 0, None)
+        count = np.where(past & (running_count[idx] > 0), running_count[idx], np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return running_sum[idx] / count
+
+
+class LagRegression:
+    def __init__(self, lags=(0, 1, 47, 335), refit_every=48, ridge=1e-6):
+        '''lags are the offsets from the origin of the values used as features,
+        the default uses the last two values and the values one day and one
+        week before the first interval forecast. The models are refit every
+        refit_every origins. ridge is added to the diagonal of the normal
+        equations to keep them solvable.'''
+
+        self.lags = np.array(lags)
+        self.min_history = int(self.lags.max())
+        self.refit_every = refit_every
+        self.ridge = ridge
+
+    def forecast(self, y, slots, origins, horizon):
+        '''Returns the forecasts (origins x horizon) of the intervals after each
+        origin. For each horizon h, the coefficients used at an origin are
+        fitted on every interval whose target, h intervals later, was known at
+        the last refit before the origin.'''
+
+        n = len(y)
+        p = len(self.lags) + 1
+
+        # Features of every interval, rows with a missing value are left out
+        rows = np.arange(n)
+        feat_idx = rows[:, None] - self.lags[None, :]
+        X = np.ones((n, p))
+        X[:, 1:] = np.where(feat_idx >= 0, y[np.clip(feat_idx, 0, n - 1)], np.nan)
+        x_valid = ~np.isnan(X).any(axis=1)
+        X[~x_valid] = 0.0
+        outer = X[:, :, None] * X[:, None, :]
+
+        refit = (origins // self.refit_every) * self.refit_every
+        m = max(refit.max(), 1)
+        F = np.full((len(origins), horizon), np.nan)
+        eye = self.ridge * np.eye(p)
+
+        for h in range(horizon):
+            target_idx = rows + h + 1
+            target = np.where(target_idx < n, y[np.clip(target_idx, 0, n - 1)], np.nan)
+            use = x_valid & ~np.isnan(target)
+
+            # Running sums of X'X and X'y over the rows used for horizon h, so
+            # the fit at any refit point is read from one row of each
+            A = np.cumsum(np.where(use[:m, None, None], outer[:m], 0.0), axis=0)
+            b = np.cumsum(np.where(use[:m, None], X[:m] * target[:m, None], 0.0), axis=0)
+
+            # The last row whose target is known at the refit point
+            last = refit - h - 1
+            ok = last >= p
+            beta = np.full((len(origins), p), np.nan)
+            if ok.any():
+                beta[ok] = np.linalg.solve(A[last[ok]] + eye, b[last[ok]][:, :, None])[:, :, 0]
+            F[:, h] = (X[origins] * beta).sum(axis=1)
+            F[~x_valid[origins], h] = np.nan
+
+        return F
+
+
+def seasonal_index(origins, horizon, period):
+    '''Returns the index (origins x horizon) of the last interval at or before
+    each origin that is in the same slot as each forecast interval. The index
+    is negative where the series has no such interval.'''
+
+    steps = np.arange(1, horizon + 1)
+    back = period * -(-steps // period)
+    return origins[:, None] + steps[None, :] - back[None, :]
+
+def backtest_chunk(y, slots, model, origins, horizon):
+    '''Runs a model on a chunk of origins and returns the sums of absolute and
+    squared errors and the counts for each horizon and each slot of the day.'''
+
+    F = model.forecast(y, slots, origins, horizon)
+    target_idx = origins[:, None] + np.arange(1, horizon + 1)[None, :]
+    err = F - y[target_idx]
+    valid = ~np.isnan(err)
+    abs_err = np.where(valid, np.abs(err), 0.0)
+    sq_err = np.where(valid, err ** 2, 0.0)
+
+    by_horizon = np.stack([abs_err.sum(axis=0), sq_err.sum(axis=0), valid.sum(axis=0)])
+    day_slot = (slots[target_idx] % DAY_SLOTS).ravel()
+    by_slot = np.stack([np.bincount(day_slot, abs_err.ravel(), DAY_SLOTS),
+                        np.bincount(day_slot, sq_err.ravel(), DAY_SLOTS),
+                        np.bincount(day_slot, valid.ravel(), DAY_SLOTS)])
+    return by_horizon, by_slot
+
+def backtest(series, models, horizon=48, start=WEEK_SLOTS * 2, step=1, chunk_size=2000,
+             workers=None):
+    '''Takes a dict of series on a regular 30 minute grid (see grid_30 in
+    data_handler.py) and a dict of models, and forecasts horizon intervals from
+    every step-th origin after start. start must leave room for the longest
+    season or lag of the models. Returns two DataFrames of MAE, RMSE and
+    count: one indexed by series, model and horizon, and one by series, model
+    and slot of the day.'''
+
+    # Every origin needs the seasons and lags of every model before it
+    min_history = max(model.min_history for model in models.values())
+    if start < min_history:
+        raise DataHandlerError('start must be at least ' + str(min_history) +
+                               ' intervals for the seasons and lags of the models')
+
+    jobs = []
+    for s_name, s in series.items():
+        y = s.to_numpy(dtype=np.float64)
+        slots = minute_of(s.index, 'weeks') // 30
+        origins = np.arange(start, len(y) - horizon, step)
+        if len(origins) == 0:
+            raise DataHandlerError(str(s_name) + ' is too short to backtest')
+        for m_name, model in models.items():
+            for i in range(0, len(origins), chunk_size):
+                jobs.append((s_name, m_name, (y, slots, model, origins[i:i+chunk_size], horizon)))
+
+    # Run every chunk in the pool and add up the errors of each series and model
+    totals = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [(s_name, m_name, pool.submit(backtest_chunk, *args))
+                   for s_name, m_name, args in jobs]
+        for s_name, m_name, future in futures:
+            by_horizon, by_slot = future.result()
+            if (s_name, m_name) in totals:
+                totals[(s_name, m_name)][0] += by_horizon
+                totals[(s_name, m_name)][1] += by_slot
+            else:
+                totals[(s_name, m_name)] = [by_horizon, by_slot]
+
+    horizon_frames = []
+    slot_frames = []
+    for (s_name, m_name), (by_horizon, by_slot) in totals.items():
+        horizon_frames.append(error_frame(by_horizon, s_name, m_name, 'horizon',
+                                          range(1, horizon + 1)))
+        slot_frames.append(error_frame(by_slot, s_name, m_name, 'slot', slot_labels('days')))
+    return pd.concat(horizon_frames).sort_index(), pd.concat(slot_frames).sort_index()
+
+def error_frame(sums, s_name, m_name, level, labels):
+    '''Returns a DataFrame of the MAE, RMSE and count from the sums of
+    absolute and squared errors and the counts.'''
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mae = sums[0] / sums[2]
+        rmse = np.sqrt(sums[1] / sums[2])
+    index = pd.MultiIndex.from_product([[s_name], [m_name], labels],
+                                       names=['series', 'model', level])
+    return pd.DataFrame({'MAE': mae, 'RMSE': rmse, 'count': sums[2].astype(np.int64)},
+                        index=index)
@@ -0,0 +1,215 @@
+'''
+See the README for more detail about the general project.
+
+This script contains a class object that keeps a cube of the energy generated,
+the revenue earned and the volume weighted average price of each fuel type for
+each 30 minute slot of the week, for each period (week by default) of the data.
+
+The 5 minute generation of each fuel is converted to energy (MWh) and matched
+to the spot price of the 30 minute trading interval it belongs to, so the two
+resolutions are aligned in one vectorized pass without resampling. Negative
+generation, such as batteries charging or pumps, gives negative energy and
+revenue, i.e. a cost. Intervals without a price are left out of the cube.
+
+The cube is updated incrementally, so new weeks of data can be added as they
+are loaded without recomputing the weeks already in the cube.
+
+## Use Case:
+
+Import the class from generation_cube.py:
+    from generation_cube import RevenueCube
+
+Set up a RevenueCube class object and add the data of a DataHandler:
+    c = RevenueCube(period='W')
+    c.update(h.df_5, h.df_30)
+
+Get the volume weighted average price of each fuel for each time slot:
+    c.vwap(time_len='days')
+    - time_len options are: 'weeks' (336 slots) and 'days' (48 slots)
+    - start and end select the periods to include
+
+Get the cube as a long DataFrame of MWh, revenue and vwap:
+    c.to_frame()
+
+Save and load the cube:
+    c.save('clean_data/sa1_revenue_cube.npz')
+    c = RevenueCube.load('clean_data/sa1_revenue_cube.npz')
+
+'''
+
+import numpy as np
+import pandas as pd
+
+from data_handler import DataHandlerError, minute_of, slot_labels, WEEK_SLOTS, DAY_SLOTS
+
+# Fields of the data that are generation (or load) of a fuel type
+FUELS = ['BATTERY', 'BIOMASS', 'BLACK_COAL', 'BROWN_COAL', 'DISTILLATE', 'GAS_CCGT',
+         'GAS_OCGT', 'GAS_RECIP', 'GAS_STEAM', 'HYDRO', 'PUMPS', 'SOLAR', 'WIND',
+         'ROOFTOP_SOLAR']
+
+
+class RevenueCube:
+    def __init__(self, period='W'):
+        '''period is the pandas frequency of the periods of the cube, e.g. 'D',
+        'W' or 'M'.'''
+
+        self.period = period
+        self.fuels = []
+        self.periods = pd.PeriodIndex([], freq=period)
+        self.mwh = np.zeros((0, WEEK_SLOTS, 0))
+        self.revenue = np.zeros((0, WEEK_SLOTS, 0))
+
+    def update(self, df_5, df_30):
+        '''Adds the energy and revenue of each fuel in df_5 and df_30 to the
+        cube. The price is taken from the PRICE field of df_30. The data added
+        should not overlap data that is already in the cube.'''
+
+        if 'PRICE' not in list(df_30):
+            raise DataHandlerError('PRICE must be a field of df_30')
+        price = df_30['PRICE']
+        price = price[~price.index.duplicated()]
+
+        for df, hours in [(df_5, 5 / 60), (df_30, 0.5)]:
+            fuels = [f for f in FUELS if f in list(df) and df[f].notna().any()]
+            if not fuels or df.empty:
+                continue
+
+            # Label each row with the end of its 30 minute trading interval and
+            # look up the price of that interval
+            ti = df.index.ceil('30Min')
+            ti_price = price.reindex(ti).values
+            energy = df[fuels].to_numpy(dtype=np.float64) * hours
+            keep = ~np.isnan(ti_price)
+            energy = np.where(np.isnan(energy), 0.0, energy)[keep]
+            revenue = energy * ti_price[keep, None]
+
+            # The period of an interval is the one it starts in, so the interval
+            # ending at midnight on a period boundary belongs to the period before
+            slots = minute_of(ti[keep], 'weeks') // 30
+            periods = (ti[keep] - pd.Timedelta('1ns')).to_period(self.period)
+            self.add(fuels, slots, periods, energy, revenue)
+
+    def add(self, fuels, slots, periods, energy, revenue):
+        '''Sums the rows of energy and revenue, arrays with one column per fuel,
+        into the cube cells given by slots and periods.'''
+
+        # Grow the cube for any new fuels and periods
+        new_fuels = [f for f in fuels if f not in self.fuels]
+        new_periods = pd.PeriodIndex(periods.unique(), freq=self.period)
+        new_periods = new_periods[~new_periods.isin(self.periods)]
+        if new_fuels or len(new_periods):
+            self.grow(new_fuels, new_periods)
+
+        f_idx = np.array([self.fuels.index(f) for f in fuels])
+        p_idx = self.periods.get_indexer(periods)
+
+        # Sum each fuel's rows into its cells of the cube with one bincount
+        n_cells = WEEK_SLOTS * len(self.periods)
+        cells = slots * len(self.periods) + p_idx
+        for j, f in enumerate(f_idx):
+            self.mwh[f] += np.bincount(cells, weights=energy[:, j],
+                                       minlength=n_cells).reshape(WEEK_SLOTS, -1)
+            self.revenue[f] += np.bincount(cells, weights=revenue[:, j],
+                                           minlength=n_cells).reshape(WEEK_SLOTS, -1)
+
+    def grow(self, new_fuels, new_periods):
+        '''Adds new fuels and periods to the cube, keeping the periods sorted.'''
+
+        fuels = self.fuels + new_fuels
+        periods = self.periods.append(new_periods).sort_values()
+        p_idx = periods.get_indexer(self.periods)
+
+        for name in ['mwh', 'revenue']:
+            old = getattr(self, name)
+            new = np.zeros((len(fuels), WEEK_SLOTS, len(periods)))
+            new[:len(self.fuels)][:, :, p_idx] = old
+            setattr(self, name, new)
+
+        self.fuels = fuels
+        self.periods = periods
+
+    def merge(self, other):
+        '''Adds the cells of another RevenueCube with the same period to this
+        cube, e.g. to combine cubes built from different chunks of data.'''
+
+        if other.period != self.period:
+            raise DataHandlerError('Cubes must have the same period to be merged')
+
+        new_fuels = [f for f in other.fuels if f not in self.fuels]
+        new_periods = other.periods[~other.periods.isin(self.periods)]
+        if new_fuels or len(new_periods):
+            self.grow(new_fuels, new_periods)
+
+        f_idx = [self.fuels.index(f) for f in other.fuels]
+        p_idx = self.periods.get_indexer(other.periods)
+        for i, f in enumerate(f_idx):
+            self.mwh[f][:, p_idx] += other.mwh[i]
+            self.revenue[f][:, p_idx] += other.revenue[i]
+        return self
+
+    def select(self, start=None, end=None, time_len='weeks'):
+        '''Returns the MWh and revenue arrays (fuel x slot) summed over the
+        periods between start and end, with weekly or daily slots.'''
+
+        if time_len not in ['weeks', 'days']:
+            raise DataHandlerError("time_len must be 'days' or 'weeks'")
+
+        keep = np.ones(len(self.periods), dtype=bool)
+        if start is not None:
+            keep &= self.periods.end_time >= pd.Timestamp(start)
+        if end is not None:
+            keep &= self.periods.start_time <= pd.Timestamp(end)
+
+        mwh = self.mwh[:, :, keep].sum(axis=2)
+        revenue = self.revenue[:, :, keep].sum(axis=2)
+        if time_len == 'days':
+            mwh = mwh.reshape(len(self.fuels), 7, DAY_SLOTS).sum(axis=1)
+            revenue = revenue.reshape(len(self.fuels), 7, DAY_SLOTS).sum(axis=1)
+        return mwh, revenue
+
+    def vwap(self, fuel='all', start=None, end=None, time_len='weeks'):
+        '''Returns a DataFrame of the volume weighted average price ($/MWh) of
+        each fuel (columns) for each 30 minute slot of the week or day (index),
+        over the periods between start and end.'''
+
+        mwh, revenue = self.select(start, end, time_len)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            vwap = np.where(mwh != 0, revenue / mwh, np.nan)
+        vwap_df = pd.DataFrame(vwap.T, columns=self.fuels, index=slot_labels(time_len))
+
+        if fuel != 'all':
+            vwap_df = vwap_df[fuel]
+        return vwap_df
+
+    def to_frame(self):
+        '''Returns the cube as a DataFrame indexed by fuel, period and slot,
+        with columns MWh, revenue and vwap.'''
+
+        index = pd.MultiIndex.from_product([self.fuels, range(WEEK_SLOTS), self.periods],
+                                           names=['fuel', 'slot', 'period'])
+        cube_df = pd.DataFrame({'MWh': self.mwh.ravel(), 'revenue': self.revenue.ravel()},
+                               index=index)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cube_df['vwap'] = cube_df['revenue'] / cube_df['MWh'].where(cube_df['MWh'] != 0)
+        return cube_df.reorder_levels(['fuel', 'period', 'slot']).sort_index()
+
+    def save(self, fname):
+        '''Saves the cube to a compressed numpy .npz file.'''
+
+        np.savez_compressed(fname, mwh=self.mwh, revenue=self.revenue,
+                            fuels=np.array(self.fuels, dtype=str),
+                            periods=np.array([str(p) for p in self.periods], dtype=str),
+                            period=np.array(self.period, dtype=str))
+
+    @classmethod
+    def load(cls, fname):
+        '''Loads a cube saved with save().'''
+
+        data = np.load(fname)
+        cube = cls(period=str(data['period']))
+        cube.fuels = list(data['fuels'])
+        cube.periods = pd.PeriodIndex(list(data['periods']), freq=cube.period)
+        cube.mwh = data['mwh']
+        cube.revenue = data['revenue']
+        return cube
+
@@ -0,0 +1,218 @@
+'''
+See the README for more detail about the general project.
+
+This script contains a class object that stores the 5 minute and 30 minute NEM
+data as one memory-mapped numpy array per region and field. Each array sits on
+a fixed grid starting at the region's epoch t0, so the row of any timestamp t is
+simply (t - t0) / 5min (or / 30min for 30 minute fields) and missing intervals
+are stored as NaN. Slices of the arrays are views of the memory-mapped file, so
+they are never copied and the pages are shared by the OS page cache between all
+processes that open the same store.
+
+## Layout:
+    data/grid/<region>/meta.json    - t0, length and resolution of each field
+    data/grid/<region>/<FIELD>.npy  - one float64 array per field
+
+## Use Case:
+
+Import the class from grid_store.py:
+    from grid_store import GridStore
+
+Set up a GridStore class object:
+    g = GridStore(root='data/grid')
+
+Convert the CSV archive in data/power for a region:
+    g.convert_csv_archive(region='sa1', data_dir='data/power')
+
+Get a zero-copy numpy slice or a pandas Series of a field:
+    arr = g.slice(region='sa1', field='DEMAND', start='2019-01-01', end='2019-01-02')
+    s = g.series(region='sa1', field='PRICE', start='2019-01-01', end='2019-01-02')
+
+Let a DataHandler serve query() from the store:
+    h.grid_store = g
+
+'''
+
+import datetime
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_handler import DataHandler, DataHandlerError, FIELDS_30, ARCHIVE_FILE_SPAN
+
+
+class GridStore:
+    def __init__(self, root='data/grid'):
+        self.root = root
+        self.meta = {}
+        self.arrays = {}
+
+    def convert_csv_archive(self, region='sa1', data_dir='data/power'):
+        '''This function takes a region and the folder of weekly archive CSVs
+        and writes one memory-mapped array per field to root/<region>. The grid
+        starts at midnight on the date of the first archive file and ends at the
+        end of the last one. Values that do not sit on the grid are dropped.'''
+
+        handler = DataHandler(data_dir=data_dir)
+        handler.build_file_index()
+        files = handler.file_index.get(region, [])
+        if not files:
+            raise GridStoreError('No archived data found for ' + region)
+
+        # Read only the headers to find every field in the archive
+        fields = []
+        for d, path in files:
+            for f in list(pd.read_csv(path, index_col=0, nrows=0)):
+                if f not in fields:
+                    fields.append(f)
+
+        t0 = pd.Timestamp(files[0][0])
+        t_end = pd.Timestamp(files[-1][0] + ARCHIVE_FILE_SPAN)
+        res = {f: 30 if f in FIELDS_30 else 5 for f in fields}
+
+        # Create the arrays filled with NaN at temporary paths, so workers that
+        # have the current files memory-mapped keep reading them until the new
+        # files are complete
+        region_dir = os.path.join(self.root, region)
+        os.makedirs(region_dir, exist_ok=True)
+        arrays = {}
+        for f in fields:
+            length = int((t_end - t0) / pd.Timedelta(minutes=res[f])) + 1
+            arrays[f] = np.lib.format.open_memmap(os.path.join(region_dir, f + '.npy.tmp'),
+                            mode='w+', dtype=np.float64, shape=(length,))
+            arrays[f][:] = np.nan
+
+        # Write each file into the grid using the computed row offsets
+        for d, path in files:
+            temp_df = pd.read_csv(path, index_col=0, parse_dates=True)
+            minutes = (temp_df.index - t0).total_seconds().values // 60
+            for f in list(temp_df):
+                values = temp_df[f].values
+                on_grid = (minutes % res[f] == 0) & ~np.isnan(values)
+                arrays[f][(minutes[on_grid] // res[f]).astype(np.int64)] = values[on_grid]
+
+        for f in fields:
+            arrays[f].flush()
+        del arrays
+
+        # Move the new files into place, the meta data last. Workers that have
+        # the old files mapped keep the old data until they reopen them.
+        for f in fields:
+            os.replace(os.path.join(region_dir, f + '.npy.tmp'), os.path.join(region_dir, f + '.npy'))
+        meta = {'t0': str(t0), 'fields': fields, 'res': res,
+                'converted': str(datetime.datetime.now())}
+        meta_path = os.path.join(region_dir, 'meta.json')
+        with open(meta_path + '.tmp', 'w') as fp:
+            json.dump(meta, fp, indent=1)
+        os.replace(meta_path + '.tmp', meta_path)
+
+        # Drop any arrays of the region that were opened before the conversion
+        self.meta.pop(region, None)
+        for key in [k for k in self.arrays if k[0] == region]:
+            del self.arrays[key]
+
+    def load_meta(self, region):
+        '''Returns the meta data of a region, reading meta.json the first time.
+        Returns None if the region has not been converted.'''
+
+        if region not in self.meta:
+            path = os.path.join(self.root, region, 'meta.json')
+            if not os.path.exists(path):
+                return None
+            with open(path) as fp:
+                self.meta[region] = json.load(fp)
+        return self.meta[region]
+
+    def has(self, region, fields='all'):
+        '''Returns True if the store holds the region and each of the fields.'''
+
+        meta = self.load_meta(region)
+        if meta is None:
+            return False
+        if fields == 'all':
+            return True
+        if type(fields) is not list:
+            fields = [fields]
+        return all(f in meta['fields'] for f in fields)
+
+    def array(self, region, field):
+        '''Returns the read-only memory-mapped array of a region and field.'''
+
+        if not self.has(region, field):
+            raise GridStoreError(str(field) + ' for ' + str(region) + ' is not in the store')
+        key = (region, field)
+        if key not in self.arrays:
+            path = os.path.join(self.root, region, field + '.npy')
+            self.arrays[key] = np.load(path, mmap_mode='r')
+        return self.arrays[key]
+
+    def offsets(self, region, field, start, end):
+        '''Returns the first and last+1 rows of the grid of a field that fall
+        between start and end (inclusive), clipped to the length of the array.'''
+
+        meta = self.load_meta(region)
+        step = pd.Timedelta(minutes=meta['res'][field])
+        t0 = pd.Timestamp(meta['t0'])
+        length = len(self.array(region, field))
+
+        i = -((t0 - pd.Timestamp(start)) // step)
+        j = (pd.Timestamp(end) - t0) // step + 1
+        return int(min(max(i, 0), length)), int(min(max(j, 0), length))
+
+    def slice(self, region='sa1', field='DEMAND', start='2019-01-01', end='2019-01-02'):
+        '''Returns a zero-copy view of the memory-mapped array of a field
+        between start and end (inclusive).'''
+
+        i, j = self.offsets(region, field, start, end)
+        return self.array(region, field)[i:j]
+
+    def grid_index(self, region, field, i, j):
+        '''Returns the DatetimeIndex of rows i to j of the grid of a field.'''
+
+        meta = self.load_meta(region)
+        step = pd.Timedelta(minutes=meta['res'][field])
+        return pd.date_range(pd.Timestamp(meta['t0']) + i * step, periods=j - i, freq=step)
+
+    def series(self, region='sa1', field='DEMAND', start='2019-01-01', end='2019-01-02'):
+        '''Returns a pandas Series of a field between start and end that wraps
+        the memory-mapped array without copying it.'''
+
+        i, j = self.offsets(region, field, start, end)
+        return pd.Series(self.array(region, field)[i:j], copy=False, name=field,
+                         index=self.grid_index(region, field, i, j))
+
+    def query(self, region='sa1', start='2019-01-01', end='2019-01-08', fields='all'):
+        '''Returns a DataFrame in the same layout as the CSV archive, with a
+        row for every 5 minute interval between start and end (inclusive) that
+        the store covers and the 30 minute fields aligned on the 5 minute grid.
+        Intervals that are missing from the archive are rows of NaN values.
+        Raises GridStoreError if the store has no intervals in the range.'''
+
+        if fields == 'all':
+            fields = self.load_meta(region)['fields']
+        if type(fields) is not list:
+            fields = [fields]
+
+        # The archive files start 5 minutes after t0, so row 0 of the grid is
+        # not part of any file
+        meta = self.load_meta(region)
+        t0 = pd.Timestamp(meta['t0'])
+        step = pd.Timedelta(minutes=meta['res'][fields[0]])
+        t_end = t0 + (len(self.array(region, fields[0])) - 1) * step
+        first = max(pd.Timestamp(start).ceil('5Min'), t0 + pd.Timedelta(minutes=5))
+        last = min(pd.Timestamp(end), t_end)
+        index = pd.date_range(first, last, freq='5Min')
+        if len(index) == 0:
+            raise GridStoreError('No archived data found for ' + region + ' between ' +
+                                 str(pd.Timestamp(start)) + ' and ' + str(pd.Timestamp(end)))
+
+        query_df = pd.concat([self.series(region, f, start, end).reindex(index) for f in fields],
+                             axis=1)
+        query_df.index.freq = None
+        return query_df
+
+
+class GridStoreError(DataHandlerError):
+    pass
@@ -0,0 +1,235 @@
+'''
+See the README for more detail about the general project.
+
+This script contains a class object that keeps a histogram of each field for
+each 30 minute slot of the week, as a field x slot x bin cube of counts. The bin
+edges of each field are fixed, so cubes built from different chunks of data or
+from different regions can be merged by adding their counts, and new weekly
+files can be added to the cube as they are loaded.
+
+PRICE uses bins that are evenly spaced on a log scale in both directions from
+zero, as prices span from -$1000 to $15000/MWh but are mostly below $300/MWh.
+The first and last bins of each field are open ended, so no value is lost.
+
+Percentiles, modes and probabilities of any slot are then read from the counts
+of that slot, without touching the data.
+
+## Use Case:
+
+Import the class from hist_cube.py:
+    from hist_cube import HistCube
+
+Set up a HistCube class object and add the data of a DataHandler:
+    c = HistCube()
+    c.update(h.df_5, h.df_30)
+
+Query the distribution of a field in a slot:
+    c.percentile(field='PRICE', slot='Tue 18:00', q=90)
+    c.mode(field='DEMAND', slot='18:00')
+    c.prob(field='PRICE', slot='Tue 18:00', lo=300)
+    - slot can be a slot of the week ('Tue 18:00'), a slot of the day
+      ('18:00', all days of the week) or an index from 0 to 335
+    - slots are labelled with the end of their 30 minute interval
+
+Merge cubes and save/load them:
+    c.merge(other_cube)
+    c.save('clean_data/sa1_hist_cube.npz')
+    c = HistCube.load('clean_data/sa1_hist_cube.npz')
+
+'''
+
+import numpy as np
+
+from data_handler import DataHandlerError, minute_of, slot_labels, WEEK_SLOTS, DAY_SLOTS
+
+
+def log_edges(lo=-1000, hi=15000, n=100, linear=1.0):
+    '''Returns bin edges that are evenly spaced on a log scale from linear to
+    hi and from -linear to lo, with n bins per side, and one bin between
+    -linear and linear.'''
+
+    pos = np.logspace(np.log10(linear), np.log10(hi), n + 1)
+    neg = -np.logspace(np.log10(linear), np.log10(-lo), n + 1)[::-1]
+    return np.concatenate((neg, pos))
+
+# The fixed inner bin edges of each field, values outside the edges are counted
+# in the first and last bins. Fields not listed use GENERATION_EDGES.
+DEFAULT_EDGES = {
+    'PRICE': log_edges(-1000, 15000, 100),
+    'DEMAND': np.linspace(0, 15000, 301),
+    'TEMPERATURE': np.linspace(-10, 50, 121),
+}
+GENERATION_EDGES = np.linspace(-2000, 14000, 321)
+
+# The weekly slot indexes of each slot label, e.g. 'Tue 18:00' or '18:00'
+SLOT_INDEX = {label: [i] for i, label in enumerate(slot_labels('weeks'))}
+SLOT_INDEX.update({label: [i + DAY_SLOTS * d for d in range(7)]
+                   for i, label in enumerate(slot_labels('days'))})
+
+
+class HistCube:
+    def __init__(self, edges=None):
+        '''edges is a dict of the inner bin edges of any fields that should not
+        use the default bins.'''
+
+        self.edges = dict(DEFAULT_EDGES)
+        if edges is not None:
+            self.edges.update(edges)
+        self.counts = {}
+        self.full_edges = {}
+
+    def field_edges(self, field):
+        '''Returns the bin edges of a field, including the open ended bins.'''
+
+        if field not in self.full_edges:
+            inner = self.edges.get(field, GENERATION_EDGES)
+            self.full_edges[field] = np.concatenate(([-np.inf], inner, [np.inf]))
+        return self.full_edges[field]
+
+    def update(self, df_5, df_30):
+        '''Adds the values of every field of df_5 and df_30 to the counts of
+        their slot. 5 minute values are counted in the slot of the 30 minute
+        interval they belong to.'''
+
+        for df in [df_5, df_30]:
+            if df.empty:
+                continue
+            slots = minute_of(df.index.ceil('30Min'), 'weeks') // 30
+            for f in list(df):
+                values = df[f].to_numpy(dtype=np.float64)
+                valid = ~np.isnan(values)
+                if not valid.any():
+                    continue
+                self.add(f, slots[valid], values[valid])
+
+    def add(self, field, slots, values):
+        '''Counts values into the bins of their slots for a field.'''
+
+        edges = self.field_edges(field)
+        n_bins = len(edges) - 1
+        bins = np.searchsorted(edges, values, side='right') - 1
+        counts = np.bincount(slots * n_bins + bins, minlength=WEEK_SLOTS * n_bins)
+
+        if field not in self.counts:
+            self.counts[field] = np.zeros((WEEK_SLOTS, n_bins), dtype=np.uint32)
+        self.counts[field] += counts.reshape(WEEK_SLOTS, n_bins).astype(np.uint32)
+
+    def merge(self, other):
+        '''Adds the counts of another HistCube with the same bins to this one.'''
+
+        for f, counts in other.counts.items():
+            if not np.array_equal(self.field_edges(f), other.field_edges(f)):
+                raise DataHandlerError('Cubes must have the same bins to be merged: ' + f)
+            if f in self.counts:
+                self.counts[f] += counts
+            else:
+                self.counts[f] = counts.copy()
+        return self
+
+    def slot_counts(self, field, slot):
+        '''Returns the counts of a field for a slot, summed over every day of
+        the week if a slot of the day is given.'''
+
+        if field not in self.counts:
+            raise DataHandlerError(str(field) + ' is not in the cube')
+        return self.counts[field][parse_slot(slot)].sum(axis=0)
+
+    def percentile(self, field='PRICE', slot='Tue 18:00', q=50):
+        '''Returns the q-th percentile (0 to 100) of a field in a slot,
+        interpolated linearly within the bin it falls in.'''
+
+        return bin_percentile(self.slot_counts(field, slot), self.field_edges(field), q)
+
+    def mode(self, field='PRICE', slot='Tue 18:00'):
+        '''Returns the centre of the bin with the most values of a field in a
+        slot.'''
+
+        counts = self.slot_counts(field, slot)
+        if counts.sum() == 0:
+            return np.nan
+        edges = self.field_edges(field)
+        b = np.argmax(counts)
+        lo, hi = edges[b], edges[b + 1]
+        if np.isinf(lo):
+            return hi
+        if np.isinf(hi):
+            return lo
+        return (lo + hi) / 2
+
+    def prob(self, field='PRICE', slot='Tue 18:00', lo=-np.inf, hi=np.inf):
+        '''Returns the probability that a field is between lo and hi in a slot,
+        assuming values are spread evenly within each bin.'''
+
+        counts = self.slot_counts(field, slot)
+        total = counts.sum()
+        if total == 0:
+            return np.nan
+
+        edges = self.field_edges(field)
+        left, right = edges[:-1], edges[1:]
+        with np.errstate(invalid='ignore'):
+            overlap = (np.minimum(right, hi) - np.maximum(left, lo)) / (right - left)
+        overlap = np.clip(np.nan_to_num(overlap, nan=0.0), 0, 1)
+
+        # The open ended bins count fully if they are inside the range
+        overlap[0] = 1.0 if lo == -np.inf and right[0] <= hi else overlap[0]
+        overlap[-1] = 1.0 if hi == np.inf and left[-1] >= lo else overlap[-1]
+        return float((counts * overlap).sum() / total)
+
+    def save(self, fname):
+        '''Saves the counts and bin edges to a compressed numpy .npz file.'''
+
+        arrays = {}
+        for f, counts in self.counts.items():
+            arrays['counts_' + f] = counts
+            arrays['edges_' + f] = self.edges.get(f, GENERATION_EDGES)
+        np.savez_compressed(fname, **arrays)
+
+    @classmethod
+    def load(cls, fname):
+        '''Loads a cube saved with save().'''
+
+        data = np.load(fname)
+        cube = cls()
+        for key in data.files:
+            if key.startswith('counts_'):
+                f = key[len('counts_'):]
+                cube.edges[f] = data['edges_' + f]
+                cube.counts[f] = data[key]
+        return cube
+
+
+def bin_percentile(counts, edges, q=50):
+    '''Returns the q-th percentile (0 to 100) of the values counted into the
+    bins with the given edges, interpolated linearly within the bin it falls
+    in. The open ended first and last bins return their finite edge.'''
+
+    cum = np.cumsum(counts)
+    total = cum[-1]
+    if total == 0:
+        return np.nan
+
+    target = total * q / 100
+    b = min(np.searchsorted(cum, target, side='left'), len(counts) - 1)
+
+    # The open ended bins have no width, so return their finite edge
+    lo, hi = edges[b], edges[b + 1]
+    if np.isinf(lo):
+        return hi
+    if np.isinf(hi):
+        return lo
+    before = cum[b] - counts[b]
+    return lo + (hi - lo) * (target - before) / counts[b]
+
+def parse_slot(slot):
+    '''Returns the index or indexes of the weekly slots of a slot given as an
+    index from 0 to 335, a slot of the week such as 'Tue 18:00' or a slot of
+    the day such as '18:00'.'''
+
+    if isinstance(slot, (int, np.integer)):
+        if not 0 <= slot < WEEK_SLOTS:
+            raise DataHandlerError('slot must be between 0 and ' + str(WEEK_SLOTS - 1))
+        return [slot]
+    if slot not in SLOT_INDEX:
+        raise DataHandlerError("slot must be like 'Tue 18:00', '18:00' or an index")
+    return SLOT_INDEX[slot]
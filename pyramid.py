@@ -0,0 +1,218 @@
+'''
+See the README for more detail about the general project.
+
+This script contains a class object that keeps a pyramid of pre-aggregated
+levels of the data at 30 minute, 1 hour, 1 day and 1 week resolution, with the
+sum, count, min and max of each field in each interval (the mean is sum/count).
+The 30 minute level is built from the 5 minute and 30 minute data and each
+coarser level is built from the level below it, so no level is resampled from
+the raw data. Like the rest of the project, each interval is labelled by its
+end, e.g. the 30 minute interval from 10:00 to 10:30 is labelled 10:30, and
+weeks end at midnight on Mondays like the weekly files in data/power.
+
+New data is added incrementally: only the intervals of each level that the new
+data falls in are recomputed.
+
+A resolution picker chooses the finest level that returns no more than a given
+number of points for a time range, so plots and queries of a year of data read
+a few thousand rows instead of a hundred thousand.
+
+## Use Case:
+
+Import the class from pyramid.py:
+    from pyramid import Pyramid
+
+Set up a Pyramid class object and add the data of a DataHandler:
+    p = Pyramid()
+    p.update(h.df_5, h.df_30)
+
+Get a level as a DataFrame:
+    p.level(name='1D', stat='mean')
+    - name options are: '30Min', '1h', '1D' and '1W'
+    - stat options are: 'mean', 'sum', 'count', 'min' and 'max'
+
+Query a field at the best resolution for a range:
+    p.query(field='PRICE', start='2018-01-01', end='2019-01-01', stat='max', max_points=2000)
+
+Save and load the pyramid:
+    p.save('clean_data/sa1_pyramid')
+    p = Pyramid.load('clean_data/sa1_pyramid')
+
+'''
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_handler import DataHandlerError
+
+# The levels of the pyramid, finest first, and the width of their intervals
+LEVELS = ['30Min', '1h', '1D', '1W']
+LEVEL_WIDTHS = {
+    '30Min': pd.Timedelta(minutes=30),
+    '1h': pd.Timedelta(hours=1),
+    '1D': pd.Timedelta(days=1),
+    '1W': pd.Timedelta(days=7),
+}
+STATS = ['sum', 'count', 'min', 'max']
+
+
+class Pyramid:
+    def __init__(self):
+        self.levels = {name: {stat: pd.DataFrame() for stat in STATS} for name in LEVELS}
+
+    def update(self, df_5, df_30):
+        '''Adds the data of df_5 and df_30 to the pyramid, recomputing only the
+        intervals of each level that the new data falls in.'''
+
+        # Aggregate the new 5 minute data into 30 minute intervals and add the
+        # 30 minute data as intervals with a count of one
+        new = []
+        if not df_5.empty:
+            new.append(aggregate_raw(df_5, '30Min'))
+        if not df_30.empty:
+            new.append(aggregate_raw(df_30, '30Min'))
+        if not new:
+            return
+        new = combine(new)
+
+        # Merge the new intervals into the 30 minute level, combining them with
+        # any intervals that were already partly filled
+        changed = new['sum'].index
+        self.levels['30Min'] = merge_level(self.levels['30Min'], new)
+
+        # Recompute the intervals of each coarser level that contain a changed
+        # interval of the level below, reading only the rows of the level below
+        # that fall in those intervals
+        for below, name in zip(LEVELS[:-1], LEVELS[1:]):
+            below_level = self.levels[below]
+            labels = bin_labels(changed, name)
+            index = below_level['sum'].index
+            i = index.searchsorted(labels.min() - LEVEL_WIDTHS[name], side='right')
+            j = index.searchsorted(labels.max(), side='right')
+            rebuilt = aggregate_level({s: below_level[s].iloc[i:j] for s in STATS}, name)
+            self.levels[name] = replace_level(self.levels[name], rebuilt)
+            changed = rebuilt['sum'].index
+
+    def level(self, name='30Min', stat='mean'):
+        '''Returns a stat of a level of the pyramid as a DataFrame with one
+        column per field.'''
+
+        if name not in LEVELS:
+            raise DataHandlerError('Level must be one of: ' + ', '.join(LEVELS))
+        if stat not in STATS + ['mean']:
+            raise DataHandlerError('stat must be one of: mean, ' + ', '.join(STATS))
+
+        level = self.levels[name]
+        if stat == 'mean':
+            return level['sum'] / level['count'].where(level['count'] > 0)
+        return level[stat]
+
+    def pick_level(self, start, end, max_points=2000):
+        '''Returns the name of the finest level with no more than max_points
+        intervals between start and end, or the coarsest level.'''
+
+        span = pd.Timestamp(end) - pd.Timestamp(start)
+        for name in LEVELS:
+            if span / LEVEL_WIDTHS[name] <= max_points:
+                return name
+        return LEVELS[-1]
+
+    def query(self, field='PRICE', start='2019-01-01', end='2019-02-01', stat='mean',
+              max_points=2000, level=None):
+        '''Returns a stat of a field between start and end as a Series, from
+        the finest level that has no more than max_points intervals in the range
+        unless a level is given.'''
+
+        if level is None:
+            level = self.pick_level(start, end, max_points)
+        level_df = self.level(level, stat)
+        if field not in list(level_df):
+            raise DataHandlerError(str(field) + ' is not in the pyramid')
+        return level_df[field].loc[pd.Timestamp(start):pd.Timestamp(end)]
+
+    def save(self, dirname):
+        '''Saves each stat of each level of the pyramid to dirname.'''
+
+        os.makedirs(dirname, exist_ok=True)
+        for name in LEVELS:
+            for stat in STATS:
+                self.levels[name][stat].to_pickle(os.path.join(dirname, name + '_' + stat + '.pkl'))
+
+    @classmethod
+    def load(cls, dirname):
+        '''Loads a pyramid saved with save().'''
+
+        pyramid = cls()
+        for name in LEVELS:
+            for stat in STATS:
+                pyramid.levels[name][stat] = pd.read_pickle(os.path.join(dirname, name + '_' + stat + '.pkl'))
+        return pyramid
+
+
+def bin_labels(index, name):
+    '''Returns the label of the interval of a level that each timestamp of a
+    DatetimeIndex falls in. Intervals are closed on the right and labelled by
+    their end, and weeks end at midnight on Mondays.'''
+
+    if name == '1W':
+        days = index.ceil('1D')
+        return days + pd.to_timedelta((7 - days.weekday) % 7, unit='D')
+    return index.ceil(name)
+
+def aggregate_raw(df, name):
+    '''Returns the sum, count, min and max of each field of df in each interval
+    of a level.'''
+
+    labels = bin_labels(df.index, name)
+    grouped = df.groupby(labels)
+    return {'sum': grouped.sum(), 'count': grouped.count(),
+            'min': grouped.min(), 'max': grouped.max()}
+
+def aggregate_level(level, name):
+    '''Returns the stats of each interval of a level built from the stats of
+    the level below it.'''
+
+    labels = bin_labels(level['sum'].index, name)
+    return {'sum': level['sum'].groupby(labels).sum(),
+            'count': level['count'].groupby(labels).sum(),
+            'min': level['min'].groupby(labels).min(),
+            'max': level['max'].groupby(labels).max()}
+
+def combine(levels):
+    '''Combines a list of level stats that may share intervals and fields.'''
+
+    if len(levels) == 1:
+        return levels[0]
+    stacked = {s: pd.concat([l[s] for l in levels], sort=False) for s in STATS}
+    grouped = {s: stacked[s].groupby(level=0) for s in STATS}
+    return {'sum': grouped['sum'].sum(),
+            'count': grouped['count'].sum(),
+            'min': grouped['min'].min(),
+            'max': grouped['max'].max()}
+
+def merge_level(level, new):
+    '''Merges new interval stats into a level, combining them with the stats of
+    any intervals the level already has.'''
+
+    if level['sum'].empty:
+        return new
+    overlap = new['sum'].index.intersection(level['sum'].index)
+    if len(overlap):
+        new = combine([{s: level[s].loc[overlap] for s in STATS}, new])
+    return replace_level(level, new)
+
+def replace_level(level, new):
+    '''Replaces the intervals of a level with the stats of new, adding any new
+    intervals and fields, and keeps the intervals sorted.'''
+
+    if level['sum'].empty:
+        return new
+    replaced = {}
+    for s in STATS:
+        kept = level[s].drop(index=new[s].index.intersection(level[s].index))
+        replaced[s] = pd.concat([kept, new[s]], sort=False).sort_index()
+        if s == 'count':
+            replaced[s] = replaced[s].fillna(0).astype(np.int64)
+    return replaced
@@ -0,0 +1,244 @@
+'''
+See the README for more detail about the general project.
+
+This script contains a class object that puts the PRICE and NETINTERCHANGE of
+several regions onto one shared 30 minute grid, as time x region arrays, and
+computes for every pair of regions:
+- the price spread (price of the first region minus the second) of each interval
+- separation events, runs of intervals where the absolute spread is over a
+  threshold, found with find_runs
+- the net interchange of a region binned by its spread to another region
+
+The spreads of each pair are also kept sorted with the interval they came from,
+so the intervals with a spread in any range are found with a binary search, e.g.
+the hours where the SA1-VIC1 spread is over $300/MWh.
+
+5 minute NETINTERCHANGE values are averaged over each 30 minute interval and,
+like the rest of the project, intervals are labelled by their end. Intervals
+where a region has no data are NaN, and are left out of the spreads of its
+pairs.
+
+## Use Case:
+
+Import the class from region_spread.py:
+    from region_spread import RegionSpread
+
+Load regions from the local archive, or add the data of DataHandlers:
+    s = RegionSpread()
+    s.load(regions=['sa1', 'vic1', 'nsw1'], start='2018-01-01', end='2019-01-01')
+    s.add_region('qld1', h.df_5, h.df_30)
+    s.build()
+    - load() calls build(), call it again after adding regions
+
+Get the spread of a pair as a Series:
+    s.spread('sa1', 'vic1')
+
+Find the intervals or hours with a spread in a range:
+    s.lookup('sa1', 'vic1', lo=300)
+    s.hours('sa1', 'vic1', lo=300)
+    - lo and hi are in $/MWh, either can be left out
+
+Find the separation events of a pair:
+    s.separation_events('sa1', 'vic1', threshold=100, min_length=2)
+
+Bin the net interchange of the first region of a pair by their spread:
+    s.flow_vs_spread('sa1', 'vic1', bins=[-1000, -100, -10, 10, 100, 1000])
+
+'''
+
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from data_handler import (DataHandler, DataHandlerError, find_runs, grid_30,
+                          split_resolutions)
+
+FIELDS = ['PRICE', 'NETINTERCHANGE']
+EVENT_COLUMNS = ['start', 'end', 'length', 'direction', 'mean_spread', 'max_spread']
+
+
+class RegionSpread:
+    def __init__(self, data_dir='data/power'):
+        self.data_dir = data_dir
+        self.series = {}
+        self.regions = []
+        self.pairs = []
+        self.index = pd.DatetimeIndex([])
+        self.price = np.zeros((0, 0))
+        self.flow = np.zeros((0, 0))
+        self.spreads = np.zeros((0, 0))
+        self.sorted_spreads = np.zeros((0, 0))
+        self.sorted_order = np.zeros((0, 0), dtype=np.int64)
+        self.n_valid = np.zeros(0, dtype=np.int64)
+
+    def load(self, regions=['sa1', 'vic1'], start='2019-01-01', end='2019-02-01'):
+        '''Reads PRICE and NETINTERCHANGE of each region between start and end
+        from the local archive with DataHandler.query, then builds the arrays.'''
+
+        h = DataHandler(data_dir=self.data_dir)
+        for region in regions:
+            df_5, df_30 = split_resolutions(h.query(region, start, end, fields=FIELDS))
+            self.add_region(region, df_5, df_30)
+        self.build()
+
+    def add_region(self, region, df_5, df_30):
+        '''Adds the PRICE and NETINTERCHANGE of a region from its 5 minute and
+        30 minute DataFrames. build() must be called before the region is used.'''
+
+        self.series[region] = {f: grid_30(df_5, df_30, f) for f in FIELDS}
+
+    def build(self):
+        '''Puts every region onto the shared 30 minute grid, computes the spread
+        of every pair and sorts each pair's spreads for lookups.'''
+
+        if len(self.series) < 2:
+            raise DataHandlerError('At least two regions are needed for spreads')
+
+        self.regions = sorted(self.series)
+        starts = [s['PRICE'].index[0] for s in self.series.values()]
+        ends = [s['PRICE'].index[-1] for s in self.series.values()]
+        self.index = pd.date_range(min(starts), max(ends), freq='30Min')
+
+        self.price = np.column_stack([self.series[r]['PRICE'].reindex(self.index).to_numpy(np.float64)
+                                      for r in self.regions])
+        self.flow = np.column_stack([self.series[r]['NETINTERCHANGE'].reindex(self.index).to_numpy(np.float64)
+                                     for r in self.regions])
+
+        # The spread of every pair in one array operation, one column per pair
+        self.pairs = list(itertools.combinations(range(len(self.regions)), 2))
+        first, second = np.array(self.pairs).T
+        self.spreads = self.price[:, first] - self.price[:, second]
+
+        # Sort the spreads of each pair, NaN values are sorted to the end and
+        # left out of lookups
+        self.sorted_order = np.argsort(self.spreads, axis=0, kind='stable')
+        self.sorted_spreads = np.take_along_axis(self.spreads, self.sorted_order, axis=0)
+        self.n_valid = (~np.isnan(self.spreads)).sum(axis=0)
+
+    def pair(self, a, b):
+        '''Returns the column of the pair of regions a and b in the spread
+        arrays, and -1 if their spread is stored as b minus a, else 1.'''
+
+        if a not in self.regions or b not in self.regions:
+            raise DataHandlerError('Regions must be one of: ' + ', '.join(self.regions))
+        i, j = self.regions.index(a), self.regions.index(b)
+        if i == j:
+            raise DataHandlerError('A pair must be two different regions')
+        if i < j:
+            return self.pairs.index((i, j)), 1
+        return self.pairs.index((j, i)), -1
+
+    def spread(self, a='sa1', b='vic1'):
+        '''Returns the spread (price of a minus price of b) as a Series.'''
+
+        k, sign = self.pair(a, b)
+        return pd.Series(sign * self.spreads[:, k], index=self.index, name=a + '-' + b)
+
+    def lookup_positions(self, a, b, lo=None, hi=None):
+        '''Returns the sorted positions on the grid of the intervals where the
+        spread of a minus b is between lo and hi (inclusive).'''
+
+        k, sign = self.pair(a, b)
+        if sign == -1:
+            lo, hi = (None if hi is None else -hi), (None if lo is None else -lo)
+
+        # Binary search for the range in the sorted spreads of the pair
+        values = self.sorted_spreads[:self.n_valid[k], k]
+        i = 0 if lo is None else np.searchsorted(values, lo, side='left')
+        j = len(values) if hi is None else np.searchsorted(values, hi, side='right')
+        return np.sort(self.sorted_order[i:j, k])
+
+    def lookup(self, a='sa1', b='vic1', lo=None, hi=None):
+        '''Returns the spread of a minus b in the intervals where it is between
+        lo and hi (inclusive) as a Series.'''
+
+        positions = self.lookup_positions(a, b, lo, hi)
+        k, sign = self.pair(a, b)
+        return pd.Series(sign * self.spreads[positions, k], index=self.index[positions],
+                         name=a + '-' + b)
+
+    def hours(self, a='sa1', b='vic1', lo=None, hi=None):
+        '''Returns the number of hours where the spread of a minus b is between
+        lo and hi (inclusive).'''
+
+        return len(self.lookup_positions(a, b, lo, hi)) / 2
+
+    def separation_events(self, a='sa1', b='vic1', threshold=0, min_length=1):
+        '''Returns a DataFrame with one row per separation event of a and b, a
+        run of at least min_length intervals where the absolute spread is over
+        threshold with the same sign. direction is 1 when a has the higher
+        price and -1 when b has.'''
+
+        spread = self.spread(a, b).to_numpy()
+        with np.errstate(invalid='ignore'):
+            direction = np.where(spread > threshold, 1, np.where(spread < -threshold, -1, 0))
+
+        # Runs of each direction are found separately so an event ends when the
+        # spread changes sign
+        abs_spread = np.abs(np.nan_to_num(spread))
+        events = []
+        for d in [1, -1]:
+            starts, lengths = find_runs(direction == d)
+            keep = lengths >= min_length
+            starts, lengths = starts[keep], lengths[keep]
+            if len(starts) == 0:
+                continue
+            events.append(pd.DataFrame({
+                'start': self.index[starts],
+                'end': self.index[starts + lengths - 1],
+                'length': lengths,
+                'direction': d,
+                'mean_spread': d * run_sums(abs_spread, starts, lengths) / lengths,
+                'max_spread': d * run_max(abs_spread, starts, lengths),
+            }))
+
+        if not events:
+            return pd.DataFrame(columns=EVENT_COLUMNS)
+        return pd.concat(events, ignore_index=True).sort_values('start', ignore_index=True)
+
+    def flow_vs_spread(self, a='sa1', b='vic1', bins=[-1000, -300, -100, -10, 10, 100, 300, 1000]):
+        '''Returns a DataFrame of the count, mean, min and max of the net
+        interchange of a in each bin of the spread of a minus b. The first and
+        last bins are open ended.'''
+
+        spread = self.spread(a, b).to_numpy()
+        flow = self.flow[:, self.regions.index(a)]
+        valid = ~np.isnan(spread) & ~np.isnan(flow)
+        spread, flow = spread[valid], flow[valid]
+
+        edges = np.concatenate(([-np.inf], np.asarray(bins, dtype=np.float64), [np.inf]))
+        n_bins = len(edges) - 1
+        b_idx = np.searchsorted(edges, spread, side='right') - 1
+
+        count = np.bincount(b_idx, minlength=n_bins)
+        total = np.bincount(b_idx, weights=flow, minlength=n_bins)
+        lows = np.full(n_bins, np.inf)
+        highs = np.full(n_bins, -np.inf)
+        np.minimum.at(lows, b_idx, flow)
+        np.maximum.at(highs, b_idx, flow)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = total / count
+        empty = count == 0
+        lows[empty] = np.nan
+        highs[empty] = np.nan
+        return pd.DataFrame({'count': count, 'mean': mean, 'min': lows, 'max': highs},
+                            index=pd.IntervalIndex.from_breaks(edges, closed='left',
+                                                               name='spread'))
+
+
+def run_sums(values, starts, lengths):
+    '''Returns the sum of values over each run given by starts and lengths.'''
+
+    cum = np.concatenate(([0.0], np.cumsum(values)))
+    return cum[starts + lengths] - cum[starts]
+
+def run_max(values, starts, lengths):
+    '''Returns the maximum of values over each run given by starts and
+    lengths.'''
+
+    # reduceat over the start and end of each run, then keep the runs. A
+    # value is appended so a run can end at the last value.
+    bounds = np.column_stack((starts, starts + lengths)).ravel()
+    return np.maximum.reduceat(np.append(values, 0.0), bounds)[::2]
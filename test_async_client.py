@@ -0,0 +1,80 @@
+'''
+This script will run tests on the async_client.py code to ensure it is working
+as expected using the unittest module.
+
+To run the tests, simply use the command:
+    python -m unittest
+'''
+
+import os
+import tempfile
+import unittest
+import pandas as pd
+import datetime
+import numpy as np
+
+from async_client import AsyncArchiveClient, MockArchiveServer
+from data_handler import DataHandler
+from test_data_handler import datetime_list
+
+class TestAsyncClient(unittest.TestCase):
+    def setUp(self):
+        '''This function writes three weekly archive files with a 5 minute and
+        a 30 minute field to a temporary folder and serves it with a
+        MockArchiveServer.'''
+
+        self.tmp = tempfile.TemporaryDirectory()
+        for start in [datetime.datetime(2018,12,31), datetime.datetime(2019,1,7),
+                      datetime.datetime(2019,1,14)]:
+            index = datetime_list(start, 5, 2016)
+            week_df = pd.DataFrame(index=index, columns=['DEMAND', 'PRICE'])
+            week_df['DEMAND'] = np.arange(len(week_df), dtype=float)
+            week_df['PRICE'] = np.nan
+            week_df.loc[week_df.index.minute % 30 == 0, 'PRICE'] = 50.0
+            week_df.to_csv(os.path.join(self.tmp.name, 'sa1_' + start.strftime('%Y%m%d') + '.csv'))
+
+        self.server = MockArchiveServer(data_dir=self.tmp.name).start()
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmp.cleanup()
+
+    def test_load_data(self):
+        '''Checks that a range spanning three files is downloaded and split into
+        the 5 minute and 30 minute DataFrames.'''
+
+        c = AsyncArchiveClient(base_url=self.server.url, concurrency=2, rate_limit=50)
+        df_5, df_30 = c.load_data(d1=datetime.datetime(2019,1,6),
+                                  d2=datetime.datetime(2019,1,15), region='sa1')
+
+        self.assertEqual(list(df_5), ['DEMAND'])
+        self.assertEqual(list(df_30), ['PRICE'])
+        self.assertEqual(len(df_5), 9*288 + 1)
+        self.assertEqual(len(df_30), 9*48 + 1)
+        self.assertEqual(df_5.index[0], pd.Timestamp('2019-01-06'))
+        self.assertTrue(df_5.index.is_monotonic_increasing)
+
+    def test_collect_data(self):
+        '''Checks that DataHandler.collect_data() uses the client as its loader
+        and that weeks missing from the server are skipped.'''
+
+        test_handler = DataHandler()
+        test_handler.loader = AsyncArchiveClient(base_url=self.server.url, retries=0)
+        test_handler.collect_data(d_start='2019-01-14', d_end='2019-01-25', region='sa1')
+
+        self.assertEqual(test_handler.df_5.index[-1], pd.Timestamp('2019-01-21'))
+        self.assertEqual(len(test_handler.loader.missing), 1)
+
+    def test_stream_parse(self):
+        '''Checks that parsing each response in small parts as it streams in
+        gives the same data as parsing whole files.'''
+
+        whole = AsyncArchiveClient(base_url=self.server.url)
+        parts = AsyncArchiveClient(base_url=self.server.url, chunk_size=100, parse_size=1000)
+        d1, d2 = datetime.datetime(2019,1,1), datetime.datetime(2019,1,20)
+        whole_5, whole_30 = whole.load_data(d1=d1, d2=d2, region='sa1')
+        parts_5, parts_30 = parts.load_data(d1=d1, d2=d2, region='sa1')
+
+        pd.testing.assert_frame_equal(parts_5, whole_5)
+        pd.testing.assert_frame_equal(parts_30, whole_30)
+        self.assertEqual(len(parts_5), 19*288 + 1)
@@ -0,0 +1,113 @@
+'''
+This script will run tests on the box_sketch.py code to ensure it is working as
+expected using the unittest module.
+
+To run the tests, simply use the command:
+    python -m unittest
+'''
+
+import os
+import tempfile
+import unittest
+import pandas as pd
+import datetime
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib import cbook
+
+from box_sketch import BoxSketch
+from data_handler import DataHandler
+from test_data_handler import datetime_list
+
+class TestBoxSketch(unittest.TestCase):
+    def setUp(self):
+        '''This function sets up a week of 5 minute demand and 30 minute
+        prices with a few large spikes.'''
+
+        start = datetime.datetime(2019,1,7)
+        rng = np.random.default_rng(0)
+        self.df_5 = pd.DataFrame({'DEMAND': rng.normal(1500, 300, 2016)},
+                                 index=datetime_list(start, 5, 2016))
+        price = rng.gamma(4, 20, 336)
+        price[[10, 100, 200]] = [5000, 14000, -500]
+        self.df_30 = pd.DataFrame({'PRICE': price}, index=datetime_list(start, 30, 336))
+
+    def test_exact(self):
+        '''Checks the stats match matplotlib when every value is kept.'''
+
+        s = BoxSketch(k=1000)
+        s.update(self.df_30)
+        stats = s.stats('PRICE')
+        expected = cbook.boxplot_stats(self.df_30['PRICE'].values)[0]
+
+        for key in ['med', 'q1', 'q3', 'whislo', 'whishi', 'mean']:
+            self.assertAlmostEqual(stats[key], expected[key])
+        np.testing.assert_array_equal(stats['fliers'], np.sort(expected['fliers']))
+        self.assertEqual(stats['n_low'] + stats['n_high'], len(expected['fliers']))
+
+    def test_sketch(self):
+        '''Checks the stats are close to matplotlib when only some values are
+        kept, and that merging sketches of two halves gives the same stats.'''
+
+        s = BoxSketch(k=50)
+        s.update(self.df_5)
+        stats = s.stats('DEMAND')
+        expected = cbook.boxplot_stats(self.df_5['DEMAND'].values)[0]
+        for key in ['med', 'q1', 'q3', 'whislo', 'whishi']:
+            self.assertAlmostEqual(stats[key], expected[key], delta=5)
+        self.assertAlmostEqual(s.quantile('DEMAND', 1), np.percentile(self.df_5['DEMAND'], 1), delta=5)
+        self.assertAlmostEqual(s.quantile('DEMAND', 0.5), np.percentile(self.df_5['DEMAND'], 0.5))
+
+        first = BoxSketch(k=50)
+        first.update(self.df_5.iloc[:1000])
+        second = BoxSketch(k=50)
+        second.update(self.df_5.iloc[1000:])
+        merged = first.merge(second).stats('DEMAND')
+        for key in ['med', 'q1', 'q3', 'whislo', 'whishi', 'n_low', 'n_high']:
+            self.assertAlmostEqual(merged[key], stats[key])
+
+    def test_handler_boxplot(self):
+        '''Checks the box plot stats of a DataHandler are cached per field and
+        date range, and that all fields are plotted to a file.'''
+
+        h = DataHandler()
+        h.df_5 = self.df_5
+        h.df_30 = self.df_30
+        stats = h.box_stats('all')
+        self.assertEqual([s['label'] for s in stats], ['DEMAND', 'PRICE'])
+        self.assertTrue(any(key[:4] == ('box', 'PRICE', None, None) for key in h.cache))
+        self.assertEqual(h.box_stats('PRICE', start='2019-01-08', end='2019-01-08 23:30')[0]['n'], 48)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            fname = os.path.join(tmp, 'boxplots.png')
+            h.boxplot('all', fname=fname)
+            self.assertTrue(os.path.exists(fname))
+
+        h.replace_null(method='zeros')
+        self.assertEqual(len(h.cache), 0)
+
+    def test_handler_data_changes(self):
+        '''Checks the cached box plot stats are not reused once the data of the
+        DataHandler is replaced, changed in place or filled by an rp_ method.'''
+
+        h = DataHandler()
+        h.df_5 = self.df_5
+        h.df_30 = self.df_30
+        med = h.box_stats('PRICE')[0]['med']
+
+        h.df_30 = h.df_30 * 100
+        self.assertAlmostEqual(h.box_stats('PRICE')[0]['med'], med * 100)
+        h.df_30['PRICE'] /= 100
+        self.assertAlmostEqual(h.box_stats('PRICE')[0]['med'], med)
+
+        # A value changed in place with .at on a frame that is not shared
+        h.df_30 = self.df_30.copy()
+        h.df_30['PRICE'] = np.sort(h.df_30['PRICE'].to_numpy())
+        med = h.box_stats('PRICE')[0]['med']
+        h.df_30.at[h.df_30.index[len(h.df_30) // 2], 'PRICE'] = med + 1000
+        self.assertFalse(h.box_stats('PRICE')[0]['med'] == med)
+
+        h.box_stats('DEMAND')
+        h.rp_zeros(['DEMAND'])
+        self.assertEqual(len(h.cache), 0)
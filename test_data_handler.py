@@ -11,6 +11,8 @@ To run the tests, simply use the command:
     python -m unittest
 '''
 
+import os
+import tempfile
 import unittest
 import pandas as pd
 import datetime
@@ -99,6 +101,154 @@ class TestDataHandler(unittest.TestCase):
         self.assertEqual(test_handler.df_stats['Max']['E'], 9)
         self.assertEqual(test_handler.df_stats['Count']['F'], 10)
 
+    def test_query(self):
+        '''This function writes two weekly archive files to a temporary folder,
+        then calls query() on a range spanning the end of the first file and the
+        start of the second. assertEqual is called to check that only the rows
+        and fields in the range are returned.'''
+
+        with tempfile.TemporaryDirectory() as data_dir:
+            for start in [datetime.datetime(2019,1,1), datetime.datetime(2019,1,8)]:
+                index = datetime_list(start, 5, 2016)
+                week_df = pd.DataFrame(index=index, columns=['A', 'B'])
+                week_df['A'] = list(range(len(week_df)))
+                week_df['B'] = 1.0
+                week_df.to_csv(os.path.join(data_dir, 'sa1_' + start.strftime('%Y%m%d') + '.csv'))
+
+            test_handler = DataHandler(data_dir=data_dir)
+            query_df = test_handler.query(region='sa1', start='2019-01-07 23:00',
+                                          end='2019-01-08 01:00', fields='A')
+
+        self.assertEqual(list(query_df), ['A'])
+        self.assertEqual(len(query_df), 25)
+        self.assertEqual(query_df.index[0], pd.Timestamp('2019-01-07 23:00'))
+        self.assertEqual(query_df['A'].iloc[-1], 11)
+
+    def test_regularise_grid(self):
+        '''This function removes a row from a copy of self.df_5 and sets a value
+        of a copy of self.df_30 to np.nan, then calls regularise_grid() on
+        test_handler. assertEqual is called to check that the missing row is
+        added back as NaN values and that both gaps are in the gap table.'''
+
+        test_handler = DataHandler()
+        test_handler.df_5 = self.df_5.drop(self.df_5.index[[10, 11]])
+        test_handler.df_30 = self.df_30.copy()
+        test_handler.df_30.loc[self.df_30.index[4], 'E'] = np.nan
+        test_handler.regularise_grid()
+
+        self.assertEqual(len(test_handler.df_5), 60)
+        self.assertTrue(test_handler.df_5['A'].iloc[10:12].isnull().all())
+        gaps = test_handler.gap_table.set_index('field')
+        self.assertEqual(gaps.loc['A', 'length'], 2)
+        self.assertEqual(gaps.loc['A', 'start'], self.df_5.index[10])
+        self.assertEqual(gaps.loc['E', 'length'], 1)
+
+    def test_collect_data_ranges(self):
+        '''This function collects two ranges 50 days apart with a loader that
+        returns a day of data for each range, with one 5 minute row missing.
+        assertEqual is called to check that only the missing row is added back
+        as NaN values and that the period between the ranges is left out.'''
+
+        class DayLoader:
+            def load_data(self, d1, d2, region):
+                index_5 = pd.DatetimeIndex(datetime_list(d1, 5, 288))
+                index_30 = pd.DatetimeIndex(datetime_list(d1, 30, 48))
+                df_5 = pd.DataFrame({'DEMAND': 1.0}, index=index_5.delete(100))
+                df_30 = pd.DataFrame({'PRICE': 50.0}, index=index_30)
+                return df_5, df_30
+
+        test_handler = DataHandler()
+        test_handler.loader = DayLoader()
+        test_handler.collect_data(d_start=['2019-01-01', '2019-02-20'],
+                                  d_end=['2019-01-02', '2019-02-21'])
+
+        self.assertEqual(len(test_handler.df_5), 576)
+        self.assertEqual(test_handler.df_5['DEMAND'].isnull().sum(), 2)
+        self.assertEqual(len(test_handler.df_30), 96)
+        self.assertEqual(len(test_handler.gap_table), 2)
+
+    def test_by_gap_ranges(self):
+        '''This function collects two ranges 50 days apart, each with the day
+        of the month as the value and its last 5 minute value missing.
+        assertEqual is called to check that the gap table does not join the
+        last gap of the first range to the second range, and that by_gap only
+        interpolates the gap inside a range.'''
+
+        class DayLoader:
+            def load_data(self, d1, d2, region):
+                index_5 = pd.DatetimeIndex(datetime_list(d1, 5, 288))
+                index_30 = pd.DatetimeIndex(datetime_list(d1, 30, 48))
+                df_5 = pd.DataFrame({'DEMAND': float(pd.Timestamp(d1).day)}, index=index_5)
+                df_5.iloc[[100, -1], 0] = np.nan
+                df_30 = pd.DataFrame({'PRICE': 50.0}, index=index_30)
+                return df_5, df_30
+
+        test_handler = DataHandler()
+        test_handler.loader = DayLoader()
+        test_handler.collect_data(d_start=['2019-01-01', '2019-02-20'],
+                                  d_end=['2019-01-02', '2019-02-21'])
+
+        self.assertEqual(len(test_handler.gap_table), 4)
+        self.assertEqual(test_handler.gap_table['start'].iloc[1], pd.Timestamp('2019-01-02'))
+        self.assertEqual(test_handler.gap_table['length'].iloc[1], 1)
+
+        test_handler.replace_null(field='DEMAND', method='by_gap', max_interp=3)
+        self.assertEqual(test_handler.df_5['DEMAND'].iloc[100], 1.0)
+        self.assertEqual(test_handler.df_5['DEMAND'].iloc[388], 20.0)
+        self.assertTrue(np.isnan(test_handler.df_5.at[pd.Timestamp('2019-01-02'), 'DEMAND']))
+
+    def test_replace_null_by_gap(self):
+        '''This function sets up two weeks of data with the hour of the day as
+        the value, then adds a short gap and a long gap of np.nan values and
+        calls replace_null(method='by_gap') on test_handler. assertEqual is
+        called to check that the short gap is interpolated and that the long
+        gap is filled with the weekly average.'''
+
+        index = datetime_list(datetime.datetime(2019,1,1), 5, 4032)
+        df_5_replace_null_check = pd.DataFrame(index=index, columns=['A'])
+        df_5_replace_null_check['A'] = df_5_replace_null_check.index.hour.astype(float)
+        df_5_replace_null_check.iloc[10:12, 0] = np.nan
+        df_5_replace_null_check.iloc[2100:2130, 0] = np.nan
+
+        test_handler = DataHandler()
+        test_handler.df_5 = df_5_replace_null_check
+        test_handler.df_30 = self.df_30
+        test_handler.replace_null(field='A', method='by_gap', max_interp=3)
+
+        self.assertAlmostEqual(test_handler.df_5['A'].iloc[10], 1/3)
+        self.assertAlmostEqual(test_handler.df_5['A'].iloc[11], 2/3)
+        self.assertEqual(list(test_handler.df_5['A'].iloc[2100:2130]),
+                         list(test_handler.df_5.index[2100:2130].hour.astype(float)))
+        self.assertTrue(test_handler.gap_table.empty)
+
+    def test_replace_null_parallel(self):
+        '''This function adds np.nan values to two weeks of random data and
+        calls replace_null with parallel=True and parallel=False on two
+        handlers. assertTrue is called to check that both give the same
+        values for the weekly_avg, median and interpolate methods.'''
+
+        index = datetime_list(datetime.datetime(2019,1,1), 5, 4032)
+        rng = np.random.default_rng(0)
+        df_5_replace_null_check = pd.DataFrame(rng.random((4032, 3)), index=index,
+                                               columns=['A', 'B', 'C'])
+        df_5_replace_null_check[df_5_replace_null_check > 0.9] = np.nan
+        df_30_replace_null_check = self.df_30.astype(float)
+        df_30_replace_null_check.iloc[3, 0] = np.nan
+
+        for method in ['weekly_avg', 'median', 'interpolate']:
+            handlers = []
+            for parallel in [False, True]:
+                test_handler = DataHandler()
+                test_handler.df_5 = df_5_replace_null_check.copy()
+                test_handler.df_30 = df_30_replace_null_check.copy()
+                test_handler.replace_null(method=method, parallel=parallel, workers=2)
+                handlers.append(test_handler)
+
+            self.assertTrue(np.allclose(handlers[0].df_5.values, handlers[1].df_5.values, equal_nan=True))
+            self.assertTrue(np.allclose(handlers[0].df_30.values, handlers[1].df_30.values, equal_nan=True))
+
+        self.assertEqual(handlers[1].df_5.isnull().sum().sum(), 0)
+
 def datetime_list(start, timediff, length):
     temp_list = []
     for i in range(length):
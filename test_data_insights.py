@@ -0,0 +1,178 @@
+'''
+This script will run tests on the data_insights.py code to ensure it is working
+as expected using the unittest module.
+
+To run the tests, simply use the command:
+    python -m unittest
+'''
+
+import os
+import tempfile
+import unittest
+import pandas as pd
+import datetime
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from data_insights import DataInsights, STORE_CACHE
+from data_handler import DataHandler
+from test_data_handler import datetime_list
+
+class TestDataInsights(unittest.TestCase):
+    def setUp(self):
+        '''This function sets up a DataInsights object with one day of random 5
+        minute demand and a 30 minute price that depends on demand, with the
+        last 30 minute intervals missing.'''
+
+        start = datetime.datetime(2019,1,1)
+        rng = np.random.default_rng(0)
+        self.i = DataInsights()
+        self.i.df_5 = pd.DataFrame(index=datetime_list(start, 5, 288), columns=['DEMAND'])
+        self.i.df_5['DEMAND'] = rng.random(288) * 1000
+        demand_30 = self.i.df_5['DEMAND'].resample('30Min', label='right', closed='right').mean()
+        self.i.df_30 = pd.DataFrame(index=datetime_list(start, 30, 44), columns=['PRICE'])
+        self.i.df_30['PRICE'] = demand_30.values[:44] * 0.1 + rng.random(44)
+
+    def test_hist2d(self):
+        '''Checks that x and y of different lengths are aligned and binned.'''
+
+        counts, x_edges, y_edges = self.i.hist2d(x='PRICE', y='DEMAND', bins=10)['DEMAND']
+
+        self.assertEqual(counts.shape, (10, 10))
+        self.assertEqual(counts.sum(), 44)
+
+    def test_correlation(self):
+        '''Checks the pearson and spearman correlation matrices against pandas,
+        including the fields of another region.'''
+
+        other = DataHandler()
+        other.df_5 = self.i.df_5 * 2
+        other.df_30 = self.i.df_30.copy()
+        corr = self.i.correlation(method='pearson', regions={'vic1': other})
+        spearman = self.i.correlation(method='spearman')
+        aligned_df = self.i.aligned(['DEMAND', 'PRICE'])
+
+        self.assertEqual(list(corr), ['DEMAND', 'PRICE', 'vic1_DEMAND', 'vic1_PRICE'])
+        self.assertAlmostEqual(corr.loc['DEMAND', 'PRICE'], aligned_df.corr().loc['DEMAND', 'PRICE'])
+        self.assertAlmostEqual(corr.loc['DEMAND', 'vic1_DEMAND'], 1.0)
+        self.assertAlmostEqual(spearman.loc['DEMAND', 'PRICE'],
+                               aligned_df.corr(method='spearman').loc['DEMAND', 'PRICE'])
+        self.assertTrue(self.i.correlation(method='spearman') is spearman)
+
+        # Changing the data of the other region gives a new matrix
+        other.df_5['DEMAND'] = -other.df_5['DEMAND']
+        corr = self.i.correlation(method='pearson', regions={'vic1': other})
+        self.assertAlmostEqual(corr.loc['DEMAND', 'vic1_DEMAND'], -1.0)
+
+    def test_plot_overlay(self):
+        '''Checks that each day or week of the data is drawn as one line of
+        the overlay, on the hours since midnight or since Monday midnight.'''
+
+        for time_len, n_lines, first_x in [('days', 2, 0.5), ('weeks', 1, 24.5)]:
+            plt.close('all')
+            self.i.plot_overlay(field='DEMAND', time_len=time_len)
+            lines = plt.gca().get_lines()
+            self.assertEqual(len(lines), n_lines)
+            self.assertEqual(lines[0].get_xdata()[0], first_x)
+        plt.close('all')
+
+    def test_from_handler(self):
+        '''Checks DataInsights built from a DataHandler share its data and
+        cache until the handler changes its data, and that changing the data
+        of the DataInsights does not change the handler.'''
+
+        h = DataHandler()
+        h.df_5 = self.i.df_5
+        h.df_30 = self.i.df_30
+        i1 = DataInsights.from_handler(h)
+        i2 = DataInsights.from_handler(h)
+
+        self.assertTrue(np.shares_memory(i1.df_5['DEMAND'].values, h.df_5['DEMAND'].values))
+        profile = i1.profile('DEMAND', 'days')
+        self.assertTrue(i2.profile('DEMAND', 'days') is profile)
+        self.assertTrue(i2.series_30('DEMAND') is i1.series_30('DEMAND'))
+
+        # Changing the insights' data copies it and gives new results
+        i1.df_5 = i1.df_5 * 2
+        self.assertEqual(h.df_5['DEMAND'].iloc[0], self.i.df_5['DEMAND'].iloc[0])
+        self.assertAlmostEqual(i1.profile('DEMAND', 'days')['Mean'].iloc[0],
+                               profile['Mean'].iloc[0] * 2)
+        self.assertTrue(i2.profile('DEMAND', 'days') is profile)
+
+        # Changing the handler's data clears the shared cache
+        h.df_5.loc[h.df_5.index[0], 'DEMAND'] = np.nan
+        h.replace_null(method='zeros')
+        self.assertEqual(len(h.cache), 0)
+        i3 = DataInsights.from_handler(h)
+        self.assertFalse(i3.data_key(['DEMAND']) == i2.data_key(['DEMAND']))
+
+    def test_from_handler_in_place(self):
+        '''Checks that a DataInsights that changes a column in place gets new
+        results, and the results of other DataInsights of the same handler are
+        unaffected.'''
+
+        h = DataHandler()
+        h.df_5 = self.i.df_5
+        h.df_30 = self.i.df_30
+        i1 = DataInsights.from_handler(h)
+        i2 = DataInsights.from_handler(h)
+        expected = i2.profile('DEMAND', 'days')['Mean'].iloc[0]
+
+        i1.df_5['DEMAND'] *= 1000
+        self.assertAlmostEqual(i1.profile('DEMAND', 'days')['Mean'].iloc[0], expected * 1000)
+        self.assertAlmostEqual(i2.profile('DEMAND', 'days')['Mean'].iloc[0], expected)
+        self.assertAlmostEqual(DataInsights.from_handler(h).profile('DEMAND', 'days')['Mean'].iloc[0],
+                               expected)
+        self.assertAlmostEqual(h.df_5['DEMAND'].iloc[0], self.i.df_5['DEMAND'].iloc[0])
+
+        # Changing a value in place without a profile cached first
+        i3 = DataInsights.from_handler(h)
+        i3.df_5.loc[i3.df_5.index[0], 'DEMAND'] = 1e9
+        self.assertTrue(i3.series_30('DEMAND').iloc[0] > 1e7)
+        self.assertTrue(i2.series_30('DEMAND').iloc[0] < 1e7)
+
+    def test_in_place(self):
+        '''Checks that cached results are not used after a value is changed
+        in place with .at.'''
+
+        profile = self.i.profile('DEMAND', 'days')
+        counts = self.i.hist2d('PRICE', 'DEMAND', 10)['DEMAND'][0]
+        first = self.i.df_5.index[0]
+        self.i.df_5.at[first, 'DEMAND'] = 1e9
+        self.i.df_30.at[self.i.df_30.index[0], 'PRICE'] = 1e9
+
+        self.assertTrue(self.i.profile('DEMAND', 'days')['Max'].max() > 1e7)
+        self.assertTrue(profile['Max'].max() < 1e7)
+        self.assertFalse(np.array_equal(self.i.hist2d('PRICE', 'DEMAND', 10)['DEMAND'][0], counts))
+
+    def test_from_store(self):
+        '''Checks DataInsights of a clean data file share the data read once,
+        until the file changes.'''
+
+        h = DataHandler()
+        h.df_5 = self.i.df_5
+        h.df_30 = self.i.df_30
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, 'clean_data'))
+            cwd = os.getcwd()
+            os.chdir(tmp)
+            try:
+                h.save_clean_data('test.csv')
+            finally:
+                os.chdir(cwd)
+            i1 = DataInsights.from_store('test.csv', data_dir=os.path.join(tmp, 'clean_data'))
+            i2 = DataInsights.from_store('test.csv', data_dir=os.path.join(tmp, 'clean_data'))
+
+            # A newer version of the file replaces the old one in the store cache
+            path = os.path.join(tmp, 'clean_data', 'test.csv')
+            os.utime(path, (0, os.path.getmtime(path) + 10))
+            i3 = DataInsights.from_store('test.csv', data_dir=os.path.join(tmp, 'clean_data'))
+
+        self.assertEqual(list(i1.df_30), ['DEMAND', 'PRICE'])
+        self.assertEqual(len(i1.df_30), 44)
+        self.assertTrue(np.shares_memory(i1.df_30['PRICE'].values, i2.df_30['PRICE'].values))
+        self.assertTrue(i1.hist2d('PRICE', 'DEMAND', 10) is i2.hist2d('PRICE', 'DEMAND', 10))
+        self.assertFalse(np.shares_memory(i3.df_30['PRICE'].values, i1.df_30['PRICE'].values))
+        self.assertEqual(len([k for k in STORE_CACHE if k[1] == path]), 1)
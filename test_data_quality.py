@@ -0,0 +1,54 @@
+'''
+This script will run tests on the data_quality.py code to ensure it is working
+as expected using the unittest module.
+
+To run the tests, simply use the command:
+    python -m unittest
+'''
+
+import json
+import unittest
+import pandas as pd
+import datetime
+import numpy as np
+
+from data_quality import check_frames
+from test_data_handler import datetime_list
+
+class TestDataQuality(unittest.TestCase):
+    def setUp(self):
+        '''This function sets up a 5 minute and a 30 minute dataframe covering
+        the same 5 hours.'''
+
+        start = datetime.datetime(2019,1,1)
+        self.df_5 = pd.DataFrame(index=datetime_list(start, 5, 60), columns=['DEMAND', 'B'])
+        self.df_5['DEMAND'] = 100.0
+        self.df_5['B'] = 1.0
+        self.df_30 = pd.DataFrame(index=datetime_list(start, 30, 10), columns=['PRICE'])
+        self.df_30['PRICE'] = 50.0
+
+    def test_clean(self):
+        '''Checks that no problems are found in clean data.'''
+
+        report = check_frames(self.df_5, self.df_30)
+
+        self.assertTrue(report.is_clean())
+        self.assertEqual(report.rows[5], 60)
+
+    def test_report(self):
+        '''Adds a gap of NaN values, a missing interval, a duplicate timestamp
+        and a negative demand, then checks that each of them is reported.'''
+
+        df_5 = self.df_5.copy()
+        df_5.iloc[3:7, 1] = np.nan
+        df_5.iloc[20, 0] = -5.0
+        df_5 = pd.concat([df_5.iloc[:40], df_5.iloc[41:], df_5.iloc[[59]]])
+        report = check_frames(df_5, self.df_30)
+
+        self.assertEqual(report.nan_counts['B'], 4)
+        self.assertEqual(list(report.gaps['length']), [4])
+        self.assertEqual(report.gaps['start'][0], df_5.index[3])
+        self.assertEqual(list(report.missing['length']), [1])
+        self.assertEqual(report.duplicates[5], 1)
+        self.assertEqual(report.out_of_range['DEMAND'], 1)
+        self.assertEqual(json.loads(report.to_json())['nan_counts']['B'], 4)
@@ -0,0 +1,100 @@
+'''
+This script will run tests on the forecasting.py code to ensure it is working as
+expected using the unittest module.
+
+To run the tests, simply use the command:
+    python -m unittest
+'''
+
+import unittest
+import pandas as pd
+import datetime
+import numpy as np
+
+from forecasting import SeasonalNaive, ProfileMean, LagRegression, backtest
+from data_handler import DataHandlerError, grid_30
+from test_data_handler import datetime_list
+
+class TestForecasting(unittest.TestCase):
+    def setUp(self):
+        '''This function sets up six weeks of 30 minute data with a price that
+        repeats every day and a weekly step on Saturdays.'''
+
+        start = datetime.datetime(2019,1,7)
+        index = datetime_list(start, 30, 2016)
+        self.price = pd.Series(np.tile(np.arange(48.0), 42), index=pd.DatetimeIndex(index))
+        self.price[self.price.index.weekday == 5] += 100
+
+    def test_seasonal_naive(self):
+        '''Checks the daily and weekly naive forecasts.'''
+
+        y = self.price.to_numpy()
+        origins = np.array([400, 1000])
+        F = SeasonalNaive('weeks').forecast(y, None, origins, 48)
+        np.testing.assert_array_equal(F, y[origins[:, None] + np.arange(1, 49)])
+
+        F = SeasonalNaive('days').forecast(y, None, origins, 96)
+        np.testing.assert_array_equal(F[:, :48], y[origins[:, None] + np.arange(1, 49) - 48])
+        np.testing.assert_array_equal(F[:, 48:], F[:, :48])
+
+    def test_short_history(self):
+        '''Checks that forecasts from origins less than a season from the
+        start are NaN and that backtest() rejects such a start.'''
+
+        y = np.arange(2000.)
+        F = SeasonalNaive('weeks').forecast(y, None, np.array([10]), 3)
+        self.assertTrue(np.isnan(F).all())
+        F = ProfileMean('weeks').forecast(y, np.arange(2000) % 336, np.array([10]), 3)
+        self.assertTrue(np.isnan(F).all())
+
+        with self.assertRaises(DataHandlerError):
+            backtest({'price': self.price}, {'naive_week': SeasonalNaive('weeks')}, start=0)
+
+    def test_profile_mean(self):
+        '''Checks the profile mean only uses values up to the origin.'''
+
+        y = self.price.to_numpy().copy()
+        slots = np.arange(len(y)) % 336
+        origin = np.array([700])
+        y[701:] = np.nan
+        F = ProfileMean('days').forecast(y, slots, origin, 48)
+        expected = [np.nanmean(y[s:701:48]) for s in (np.arange(701, 749) % 48)]
+        np.testing.assert_allclose(F[0], expected)
+
+    def test_lag_regression(self):
+        '''Checks the regression fits a series whose next value is its value
+        one week before.'''
+
+        y = self.price.to_numpy()
+        origins = np.arange(1000, 1500, 7)
+        F = LagRegression(lags=(335,), refit_every=48).forecast(y, None, origins, 1)
+        np.testing.assert_allclose(F[:, 0], y[origins + 1], atol=1e-3)
+
+    def test_backtest(self):
+        '''Checks the errors reported per horizon and slot.'''
+
+        models = {'naive_week': SeasonalNaive('weeks'), 'naive_day': SeasonalNaive('days')}
+        by_horizon, by_slot = backtest({'price': self.price}, models, horizon=48,
+                                       start=336, chunk_size=500, workers=2)
+
+        self.assertEqual(len(by_horizon), 96)
+        self.assertEqual(len(by_slot), 96)
+        self.assertTrue((by_horizon.loc[('price', 'naive_week'), 'MAE'] == 0).all())
+        self.assertEqual(by_horizon.loc[('price', 'naive_week'), 'count'].iloc[0], 2016 - 336 - 48)
+
+        # The daily naive forecast is only wrong on Saturdays and Sundays
+        mae = by_horizon.loc[('price', 'naive_day', 1), 'MAE']
+        self.assertAlmostEqual(mae, 100 * 2 / 7, delta=5)
+        self.assertEqual(by_slot.loc[('price', 'naive_day')].index[0], '00:00')
+
+    def test_grid_30(self):
+        '''Checks 5 minute fields are resampled and gaps are filled with NaN.'''
+
+        start = datetime.datetime(2019,1,7)
+        df_5 = pd.DataFrame({'DEMAND': np.arange(24.0)}, index=datetime_list(start, 5, 24))
+        df_5 = df_5.drop(df_5.index[6:12])
+        series = grid_30(df_5, pd.DataFrame(), 'DEMAND')
+
+        self.assertEqual(len(series), 4)
+        self.assertEqual(series.iloc[0], 2.5)
+        self.assertTrue(np.isnan(series.iloc[1]))
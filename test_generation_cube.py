@@ -0,0 +1,73 @@
+'''
+This script will run tests on the generation_cube.py code to ensure it is
+working as expected using the unittest module.
+
+To run the tests, simply use the command:
+    python -m unittest
+'''
+
+import os
+import tempfile
+import unittest
+import pandas as pd
+import datetime
+import numpy as np
+
+from generation_cube import RevenueCube
+from test_data_handler import datetime_list
+
+class TestRevenueCube(unittest.TestCase):
+    def setUp(self):
+        '''This function sets up two weeks of 5 minute generation from two
+        fuels and a 30 minute price that is the hour of the day.'''
+
+        start = datetime.datetime(2019,1,7)
+        self.df_5 = pd.DataFrame(index=datetime_list(start, 5, 4032), columns=['WIND', 'BATTERY'])
+        self.df_5['WIND'] = 120.0
+        self.df_5['BATTERY'] = -12.0
+        self.df_30 = pd.DataFrame(index=datetime_list(start, 30, 672), columns=['PRICE'])
+        self.df_30['PRICE'] = self.df_30.index.hour.astype(float)
+
+    def test_vwap(self):
+        '''Checks the energy in the cube and that the volume weighted average
+        price of each daily slot matches the price.'''
+
+        c = RevenueCube(period='W')
+        c.update(self.df_5, self.df_30)
+        mwh, revenue = c.select(time_len='days')
+        vwap = c.vwap(time_len='days')
+
+        self.assertAlmostEqual(mwh[c.fuels.index('WIND')].sum(), 120.0 * 24 * 14)
+        self.assertAlmostEqual(vwap.loc['10:30', 'WIND'], 10.0)
+        self.assertAlmostEqual(vwap.loc['11:00', 'BATTERY'], 11.0)
+        self.assertTrue(revenue[c.fuels.index('BATTERY')].sum() < 0)
+
+    def test_period_boundary(self):
+        '''Checks that the interval ending at midnight on Monday belongs to the
+        week it ends, not the week after.'''
+
+        c = RevenueCube(period='W')
+        c.update(self.df_5, self.df_30)
+
+        self.assertEqual(len(c.periods), 2)
+        self.assertEqual(c.periods[-1].end_time.normalize(), pd.Timestamp('2019-01-20'))
+        self.assertAlmostEqual(c.mwh[c.fuels.index('WIND')][:, -1].sum(), 120.0 * 24 * 7)
+
+    def test_incremental(self):
+        '''Checks that updating the cube one week at a time, in any order,
+        gives the same cube as one update, and that it can be saved.'''
+
+        c = RevenueCube(period='W')
+        c.update(self.df_5, self.df_30)
+
+        c_inc = RevenueCube(period='W')
+        c_inc.update(self.df_5.iloc[2016:], self.df_30)
+        c_inc.update(self.df_5.iloc[:2016], self.df_30)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            c_inc.save(os.path.join(tmp, 'cube.npz'))
+            c_inc = RevenueCube.load(os.path.join(tmp, 'cube.npz'))
+
+        self.assertEqual(list(c.periods), list(c_inc.periods))
+        self.assertTrue(np.allclose(c.mwh, c_inc.mwh))
+        self.assertTrue(np.allclose(c.revenue, c_inc.revenue))
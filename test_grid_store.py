@@ -0,0 +1,96 @@
+'''
+This script will run tests on the grid_store.py code to ensure it is working
+as expected using the unittest module.
+
+To run the tests, simply use the command:
+    python -m unittest
+'''
+
+import os
+import tempfile
+import unittest
+import pandas as pd
+import datetime
+import numpy as np
+
+from grid_store import GridStore
+from data_handler import DataHandler, DataHandlerError
+from test_data_handler import datetime_list
+
+class TestGridStore(unittest.TestCase):
+    def setUp(self):
+        '''This function writes one weekly archive file with a 5 minute field
+        and a 30 minute field to a temporary folder, with one 5 minute interval
+        missing from the index.'''
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_dir = os.path.join(self.tmp.name, 'power')
+        os.makedirs(self.data_dir)
+
+        index = datetime_list(datetime.datetime(2019,1,1), 5, 2016)
+        week_df = pd.DataFrame(index=index, columns=['DEMAND', 'PRICE'])
+        week_df['DEMAND'] = np.arange(len(week_df), dtype=float)
+        week_df['PRICE'] = np.nan
+        week_df.loc[week_df.index.minute % 30 == 0, 'PRICE'] = 50.0
+        week_df = week_df.drop(week_df.index[10])
+        week_df.to_csv(os.path.join(self.data_dir, 'sa1_20190101.csv'))
+
+        self.store = GridStore(root=os.path.join(self.tmp.name, 'grid'))
+        self.store.convert_csv_archive(region='sa1', data_dir=self.data_dir)
+
+    def tearDown(self):
+        self.store.arrays = {}
+        self.tmp.cleanup()
+
+    def test_slice(self):
+        '''Checks that slices are found by offset, that the missing interval
+        is NaN and that 30 minute fields are on a 30 minute grid.'''
+
+        demand = self.store.slice('sa1', 'DEMAND', '2019-01-01 00:55', '2019-01-01 01:10')
+        price = self.store.slice('sa1', 'PRICE', '2019-01-01', '2019-01-01 02:00')
+
+        self.assertEqual(len(demand), 4)
+        self.assertTrue(np.isnan(demand[0]))
+        self.assertEqual(demand[1], 11.0)
+        self.assertTrue(isinstance(demand, np.memmap))
+        self.assertEqual(list(price[1:]), [50.0, 50.0, 50.0, 50.0])
+
+    def test_series(self):
+        '''Checks that series() labels the grid with the correct timestamps.'''
+
+        s = self.store.series('sa1', 'PRICE', '2019-01-07 23:00', '2019-01-08')
+
+        self.assertEqual(list(s.index), [pd.Timestamp('2019-01-07 23:00'),
+            pd.Timestamp('2019-01-07 23:30'), pd.Timestamp('2019-01-08')])
+
+    def test_query(self):
+        '''Checks that queries of the store and of the CSV archive return the
+        same rows, and that the missing interval is a row of NaN values.'''
+
+        h = DataHandler(data_dir=self.data_dir)
+        csv_df = h.query('sa1', '2019-01-01 01:00', '2019-01-01 04:00', fields=['PRICE'])
+        h.grid_store = self.store
+        store_df = h.query('sa1', '2019-01-01 01:00', '2019-01-01 04:00', fields=['PRICE'])
+
+        self.assertEqual(len(store_df), 37)
+        pd.testing.assert_frame_equal(store_df, csv_df, check_dtype=False, check_freq=False)
+
+        store_df = h.query('sa1', '2019-01-01', '2019-01-01 01:00', fields=['DEMAND', 'PRICE'])
+        self.assertEqual(store_df.index[0], pd.Timestamp('2019-01-01 00:05'))
+        self.assertEqual(len(store_df), 12)
+        self.assertTrue(store_df.loc['2019-01-01 00:55'].isnull().all())
+
+        with self.assertRaises(DataHandlerError):
+            h.query('sa1', '2019-02-01', '2019-02-02', fields=['PRICE'])
+
+    def test_convert_again(self):
+        '''Checks that converting the archive again replaces the files without
+        changing arrays that are already mapped, and leaves no temporary files.'''
+
+        old = self.store.slice('sa1', 'DEMAND', '2019-01-01 01:00', '2019-01-01 02:00')
+        self.store.convert_csv_archive(region='sa1', data_dir=self.data_dir)
+        new = self.store.slice('sa1', 'DEMAND', '2019-01-01 01:00', '2019-01-01 02:00')
+
+        np.testing.assert_array_equal(old, new)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.store.root, 'sa1'))),
+                         ['DEMAND.npy', 'PRICE.npy', 'meta.json'])
@@ -0,0 +1,63 @@
+'''
+This script will run tests on the hist_cube.py code to ensure it is working as
+expected using the unittest module.
+
+To run the tests, simply use the command:
+    python -m unittest
+'''
+
+import os
+import tempfile
+import unittest
+import pandas as pd
+import datetime
+import numpy as np
+
+from hist_cube import HistCube
+from test_data_handler import datetime_list
+
+class TestHistCube(unittest.TestCase):
+    def setUp(self):
+        '''This function sets up four weeks of 30 minute data with a price that
+        is 100 at 18:00 on Tuesdays and 50 otherwise, and a demand that goes
+        from 0 to 1000 within each day.'''
+
+        start = datetime.datetime(2019,1,7)
+        self.df_30 = pd.DataFrame(index=datetime_list(start, 30, 1344), columns=['PRICE', 'DEMAND'])
+        tue_18 = (self.df_30.index.weekday == 1) & (self.df_30.index.hour == 18) & \
+                 (self.df_30.index.minute == 0)
+        self.df_30['PRICE'] = np.where(tue_18, 100.0, 50.0)
+        self.df_30['DEMAND'] = np.tile(np.linspace(0, 1000, 48), 28)
+        self.df_5 = pd.DataFrame()
+
+    def test_queries(self):
+        '''Checks the percentile, mode and probability queries of a slot.'''
+
+        c = HistCube()
+        c.update(self.df_5, self.df_30)
+
+        self.assertEqual(c.slot_counts('PRICE', 'Tue 18:00').sum(), 4)
+        self.assertAlmostEqual(c.mode('PRICE', 'Tue 18:00'), 100, delta=5)
+        self.assertAlmostEqual(c.mode('PRICE', 'Tue 17:30'), 50, delta=3)
+        self.assertAlmostEqual(c.prob('PRICE', '18:00', lo=75), 1/7)
+        self.assertAlmostEqual(c.percentile('DEMAND', '00:00', 50), 1000, delta=50)
+        self.assertEqual(c.prob('DEMAND', 'Mon 12:00', hi=-1), 0.0)
+
+    def test_merge(self):
+        '''Checks that cubes built from two halves of the data and merged are
+        the same as a cube built from all of it, and that it can be saved.'''
+
+        c = HistCube()
+        c.update(self.df_5, self.df_30)
+        c_merged = HistCube()
+        c_merged.update(self.df_5, self.df_30.iloc[:700])
+        c_half = HistCube()
+        c_half.update(self.df_5, self.df_30.iloc[700:])
+        c_merged.merge(c_half)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            c_merged.save(os.path.join(tmp, 'cube.npz'))
+            c_merged = HistCube.load(os.path.join(tmp, 'cube.npz'))
+
+        for f in ['PRICE', 'DEMAND']:
+            self.assertTrue(np.array_equal(c.counts[f], c_merged.counts[f]))
@@ -0,0 +1,70 @@
+'''
+This script will run tests on the pyramid.py code to ensure it is working as
+expected using the unittest module.
+
+To run the tests, simply use the command:
+    python -m unittest
+'''
+
+import os
+import tempfile
+import unittest
+import pandas as pd
+import datetime
+import numpy as np
+
+from pyramid import Pyramid
+from test_data_handler import datetime_list
+
+class TestPyramid(unittest.TestCase):
+    def setUp(self):
+        '''This function sets up three weeks of random 5 minute and 30 minute
+        data.'''
+
+        start = datetime.datetime(2019,1,7)
+        rng = np.random.default_rng(0)
+        self.df_5 = pd.DataFrame(rng.random((6048, 2)), index=datetime_list(start, 5, 6048),
+                                 columns=['A', 'B'])
+        self.df_5.iloc[100:110, 0] = np.nan
+        self.df_30 = pd.DataFrame(rng.random((1008, 1)), index=datetime_list(start, 30, 1008),
+                                  columns=['PRICE'])
+
+    def test_levels(self):
+        '''Checks each level against resampling the raw data.'''
+
+        p = Pyramid()
+        p.update(self.df_5, self.df_30)
+
+        resampled = self.df_5.resample('30Min', label='right', closed='right').mean()
+        self.assertTrue(np.allclose(p.level('30Min')[['A', 'B']], resampled, equal_nan=True))
+        daily = self.df_5.resample('1D', label='right', closed='right')
+        days = p.level('1D').index
+        self.assertTrue(np.allclose(p.level('1D', 'max')[['A', 'B']], daily.max().loc[days]))
+        self.assertTrue(np.allclose(p.level('1D', 'count')[['A', 'B']], daily.count().loc[days]))
+        self.assertEqual(len(p.level('1W')), 3)
+        self.assertEqual(p.level('1W').index[0], pd.Timestamp('2019-01-14'))
+        self.assertAlmostEqual(p.level('1W', 'mean')['PRICE'].iloc[0],
+                               self.df_30['PRICE'].iloc[:336].mean())
+
+    def test_incremental(self):
+        '''Checks that adding the data in uneven chunks gives the same pyramid
+        as adding it at once, that the picker chooses a coarse level for a
+        long range and that the pyramid can be saved.'''
+
+        p = Pyramid()
+        p.update(self.df_5, self.df_30)
+        p_inc = Pyramid()
+        for i, j in [(0, 1000), (1000, 1003), (1003, 6048)]:
+            p_inc.update(self.df_5.iloc[i:j], self.df_30.iloc[i//6:j//6])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            p_inc.save(os.path.join(tmp, 'pyramid'))
+            p_inc = Pyramid.load(os.path.join(tmp, 'pyramid'))
+
+        for name in ['30Min', '1h', '1D', '1W']:
+            for stat in ['mean', 'count', 'min', 'max']:
+                a = p.level(name, stat)
+                b = p_inc.level(name, stat)[list(a)]
+                self.assertTrue(np.allclose(a, b, equal_nan=True))
+        self.assertEqual(p.pick_level('2019-01-07', '2019-01-28', max_points=100), '1D')
+        self.assertEqual(len(p.query('A', '2019-01-08', '2019-01-09', max_points=100)), 49)
@@ -0,0 +1,81 @@
+'''
+This script will run tests on the region_spread.py code to ensure it is working
+as expected using the unittest module.
+
+To run the tests, simply use the command:
+    python -m unittest
+'''
+
+import unittest
+import pandas as pd
+import datetime
+import numpy as np
+
+from region_spread import RegionSpread
+from test_data_handler import datetime_list
+
+class TestRegionSpread(unittest.TestCase):
+    def setUp(self):
+        '''This function sets up two regions with one day of data. sa1 has a
+        price of 50 except for a spike of 500 from 18:00 to 19:30, vic1 has a
+        price of 40 and starts an hour later. The net interchange of sa1 is
+        the spread divided by ten.'''
+
+        start = datetime.datetime(2019,1,7)
+        index_30 = pd.DatetimeIndex(datetime_list(start, 30, 48))
+        sa1_price = pd.Series(50.0, index=index_30)
+        sa1_price[(index_30.hour >= 18) & (index_30 <= '2019-01-07 19:30')] = 500.0
+        vic1_price = pd.Series(40.0, index=index_30[2:])
+
+        index_5 = pd.DatetimeIndex(datetime_list(start, 5, 288))
+        sa1_flow = ((sa1_price - 40) / 10).reindex(index_5, method='bfill')
+
+        self.s = RegionSpread()
+        self.s.add_region('sa1', pd.DataFrame({'NETINTERCHANGE': sa1_flow}),
+                          pd.DataFrame({'PRICE': sa1_price}))
+        self.s.add_region('vic1', pd.DataFrame({'NETINTERCHANGE': 0.0}, index=index_5),
+                          pd.DataFrame({'PRICE': vic1_price}))
+        self.s.build()
+
+    def test_spread(self):
+        '''Checks the spreads are on the shared grid in both directions.'''
+
+        spread = self.s.spread('sa1', 'vic1')
+        self.assertEqual(len(spread), 48)
+        self.assertTrue(np.isnan(spread.iloc[0]))
+        self.assertEqual(spread.iloc[2], 10)
+        self.assertEqual(self.s.spread('vic1', 'sa1').loc['2019-01-07 18:00'], -460)
+
+    def test_lookup(self):
+        '''Checks the intervals and hours with a spread in a range.'''
+
+        high = self.s.lookup('sa1', 'vic1', lo=300)
+        self.assertEqual(list(high.index), list(pd.date_range('2019-01-07 18:00', periods=4,
+                                                              freq='30Min')))
+        self.assertEqual(self.s.hours('sa1', 'vic1', lo=300), 2)
+        self.assertEqual(self.s.hours('vic1', 'sa1', hi=-300), 2)
+        self.assertEqual(self.s.hours('sa1', 'vic1', hi=10), (46 - 4) / 2)
+
+    def test_separation_events(self):
+        '''Checks the separation events and their spreads.'''
+
+        events = self.s.separation_events('sa1', 'vic1', threshold=100)
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events['start'].iloc[0], pd.Timestamp('2019-01-07 18:00'))
+        self.assertEqual(events['length'].iloc[0], 4)
+        self.assertEqual(events['max_spread'].iloc[0], 460)
+
+        events = self.s.separation_events('vic1', 'sa1', threshold=5)
+        self.assertEqual(list(events['direction']), [-1])
+        self.assertEqual(events['length'].iloc[0], 46)
+        self.assertAlmostEqual(events['mean_spread'].iloc[0], -(42 * 10 + 4 * 460) / 46)
+        self.assertEqual(len(self.s.separation_events('sa1', 'vic1', threshold=100,
+                                                      min_length=5)), 0)
+
+    def test_flow_vs_spread(self):
+        '''Checks the net interchange is binned by the spread.'''
+
+        binned = self.s.flow_vs_spread('sa1', 'vic1', bins=[0, 100])
+        self.assertEqual(list(binned['count']), [0, 42, 4])
+        self.assertEqual(binned['mean'].iloc[1], 1)
+        self.assertEqual(binned['max'].iloc[2], 46)